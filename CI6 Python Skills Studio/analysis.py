@@ -0,0 +1,228 @@
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Optional
+
+from metrics import register_collector
+from parallel import TEXT_JOBS, TextJobExecutor
+from toolkit import TextSummarizer, detailed_summary, text_statistics, word_counts
+
+ANALYSIS_BLOCK_SIZE = int(os.getenv("ANALYSIS_BLOCK_SIZE", str(16 * 1024)))
+ANALYSIS_MIN_CHARS = int(os.getenv("ANALYSIS_MIN_CHARS", str(64 * 1024)))
+ANALYSIS_MAX_CHARS = int(os.getenv("ANALYSIS_MAX_CHARS", str(64 * 1024 * 1024)))
+
+WHITESPACE = re.compile(r"\s")
+
+
+def split_blocks(text: str, block_size: int = ANALYSIS_BLOCK_SIZE) -> list[str]:
+    # Each block ends just after the first whitespace past block_size
+    # characters, so no word is split between blocks. A short remainder joins
+    # the block before it.
+    blocks = []
+    start = 0
+    while len(text) - start > block_size:
+        match = WHITESPACE.search(text, start + block_size)
+        if match is None:
+            break
+        blocks.append(text[start : match.end()])
+        start = match.end()
+    if start < len(text):
+        if blocks and len(text) - start < block_size // 4:
+            blocks[-1] += text[start:]
+        else:
+            blocks.append(text[start:])
+    return blocks
+
+
+def _summarize_block(block: str) -> TextSummarizer:
+    summarizer = TextSummarizer()
+    summarizer.feed(block)
+    return summarizer
+
+
+def _block_state(block: str) -> tuple[TextSummarizer, Counter]:
+    return _summarize_block(block), word_counts(block)
+
+
+class _Document:
+    # Per-document block state: the blocks themselves, since they are needed
+    # to find what changed, their summarizers in the same order, and word counts
+    # for the whole text.
+    def __init__(self, blocks: list[str], summaries: list[TextSummarizer], words: Counter) -> None:
+        self.blocks = blocks
+        self.summaries = summaries
+        self.words = words
+        self.characters = sum(len(block) for block in blocks)
+
+    def result(self) -> dict:
+        total = TextSummarizer()
+        for summary in self.summaries:
+            total.merge(summary)
+        return detailed_summary(total.result(), self.words)
+
+
+class IncrementalAnalyzer:
+    # Keeps block state for recently analyzed documents, keyed by the caller
+    # (the session), so re-analyzing an edited document only recounts the blocks
+    # an edit touched. Results always equal text_statistics().
+    # Least recently used documents are dropped once the stored text passes
+    # max_chars. Texts under min_chars are simply analyzed in full.
+    def __init__(
+        self,
+        block_size: int = ANALYSIS_BLOCK_SIZE,
+        min_chars: int = ANALYSIS_MIN_CHARS,
+        max_chars: int = ANALYSIS_MAX_CHARS,
+        jobs: TextJobExecutor = TEXT_JOBS,
+    ) -> None:
+        self.block_size = block_size
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.jobs = jobs
+        self._documents: OrderedDict[str, _Document] = OrderedDict()
+        self._characters = 0
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(["full", "incremental", "blocks_reused", "blocks_counted"], 0)
+
+    def analyze(self, key: Optional[str], text: str) -> dict:
+        if len(text) < self.min_chars:
+            return text_statistics(text)
+        if key is None:
+            return self._build(text).result()
+        # The document is taken out while it is updated, so a concurrent request
+        # for the same key starts from scratch instead of sharing mutable state.
+        with self._lock:
+            document = self._documents.pop(key, None)
+            if document is not None:
+                self._characters -= document.characters
+        document = self._update(document, text) if document is not None else self._build(text)
+        result = document.result()
+        if document.characters <= self.max_chars:
+            with self._lock:
+                self._documents[key] = document
+                self._characters += document.characters
+                while self._characters > self.max_chars:
+                    _, evicted = self._documents.popitem(last=False)
+                    self._characters -= evicted.characters
+        return result
+
+    def _build(self, text: str) -> _Document:
+        # Words are counted block by block too: counting the whole text at once
+        # would hold a lowercased copy and a list of every word in memory. Past
+        # PARALLEL_THRESHOLD the blocks are counted on the process pool.
+        blocks = split_blocks(text, self.block_size)
+        summaries = []
+        words: Counter = Counter()
+        for summary, counts in self.jobs.map_blocks(_block_state, blocks):
+            summaries.append(summary)
+            words.update(counts)
+        with self._lock:
+            self._counters["full"] += 1
+            self._counters["blocks_counted"] += len(blocks)
+        return _Document(blocks, summaries, words)
+
+    def _update(self, document: _Document, text: str) -> _Document:
+        old = document.blocks
+        # Leading blocks that are unchanged. The last block may not end in
+        # whitespace, so text appended to it could extend its final word; it is
+        # only kept through the trailing match below.
+        head = position = 0
+        while head < len(old) - 1 and text.startswith(old[head], position):
+            position += len(old[head])
+            head += 1
+        # Trailing blocks that are unchanged, compared in place from the end.
+        tail, end = len(old), len(text)
+        while tail > head and end - len(old[tail - 1]) >= position and text.endswith(old[tail - 1], 0, end):
+            end -= len(old[tail - 1])
+            tail -= 1
+        # The changed span must start a word; give back trailing blocks until it does.
+        while tail < len(old) and end > position and not text[end - 1].isspace():
+            end += len(old[tail])
+            tail += 1
+
+        # Between them, each old block is looked for near where it would now sit,
+        # so unchanged blocks between two far-apart edits are kept as well.
+        kept = []
+        cursor = position
+        old_start = sum(len(block) for block in old[:head])
+        shift = position - old_start
+        window = self.block_size * 4
+        for index in range(head, min(tail, len(old) - 1)):
+            block = old[index]
+            expected = old_start + shift
+            old_start += len(block)
+            if expected >= cursor and text.startswith(block, expected, end):
+                found = expected
+            else:
+                found = text.find(block, max(cursor, expected - window), min(end, expected + window + len(block)))
+            if found < 0 or (found > cursor and not text[found - 1].isspace()):
+                continue
+            kept.append((found, index))
+            cursor = found + len(block)
+            shift = cursor - old_start
+
+        kept_indexes = {index for _, index in kept}
+        removed = [old[index] for index in range(head, tail) if index not in kept_indexes]
+        if sum(len(block) for block in removed) > document.characters // 2:
+            return self._build(text)
+
+        blocks, summaries = old[:head], document.summaries[:head]
+        added = []
+        cursor = position
+        for found, index in kept + [(end, tail)]:
+            new_blocks = split_blocks(text[cursor:found], self.block_size)
+            added += new_blocks
+            blocks += new_blocks
+            summaries += [_summarize_block(block) for block in new_blocks]
+            if index < tail:
+                blocks.append(old[index])
+                summaries.append(document.summaries[index])
+                cursor = found + len(old[index])
+        blocks += old[tail:]
+        summaries += document.summaries[tail:]
+
+        words = document.words
+        for block in removed:
+            for word, count in word_counts(block).items():
+                left = words[word] - count
+                if left:
+                    words[word] = left
+                else:
+                    del words[word]
+        for block in added:
+            words.update(word_counts(block))
+
+        with self._lock:
+            self._counters["incremental"] += 1
+            self._counters["blocks_reused"] += len(old) - len(removed)
+            self._counters["blocks_counted"] += len(added)
+        return _Document(blocks, summaries, words)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._documents.clear()
+            self._characters = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["documents"] = len(self._documents)
+            stats["characters"] = self._characters
+        return stats
+
+
+ANALYSIS = IncrementalAnalyzer()
+
+
+def _analysis_metrics():
+    stats = ANALYSIS.stats()
+    yield "analysis_blocks_total", "counter", "Analyzer blocks reused from earlier passes or counted.", [
+        (("outcome",), ("reused",), stats["blocks_reused"]),
+        (("outcome",), ("counted",), stats["blocks_counted"]),
+    ]
+    yield "analysis_documents", "gauge", "Documents with block state kept for re-analysis.", [
+        ((), (), stats["documents"])
+    ]
+
+
+register_collector(_analysis_metrics)
@@ -1,21 +1,85 @@
+import math
 import os
-
-from flask import Flask, render_template, request, session
+import secrets
+import stat
+from itertools import chain
+from time import perf_counter
+
+from flask import Flask, Response, g, jsonify, render_template, request, session, stream_with_context, url_for
+from jinja2 import FileSystemBytecodeCache
+
+from analysis import ANALYSIS, ANALYSIS_MIN_CHARS
+from assets import ASSET_MAX_AGE, ASSETS, COMPRESS_MIN_BYTES, COMPRESSIBLE_TYPES, ENCODINGS, compress
+from jobs import JOB_QUEUE
+from memo import MEMO
+from metrics import METRICS_ENABLED, PHASE_SECONDS, REQUEST_SECONDS, register_collector, render_metrics, timed
+from parallel import TEXT_JOBS
+from profiling import RequestProfiler, requested_mode
+from session_store import session_store_from_env
 
 from toolkit import (
+    cipher_stream,
     cipher_transform,
     convert_fuel_consumption,
     convert_currency,
     convert_scientific_prefix,
     count_date_distance,
+    crack_cipher,
+    fx_cache,
     get_fx_rate_with_fallback,
+    get_historical_fx_rate,
+    summarize_stream,
     summarize_text,
+    text_statistics,
 )
 
 
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "dev-secret-change-me")
 
+# Set JINJA_CACHE_DIR to keep compiled templates on disk, so a restarted worker
+# skips Jinja's parse and compile step.
+JINJA_CACHE_DIR = os.getenv("JINJA_CACHE_DIR", "")
+
+
+def template_cache(directory: str) -> FileSystemBytecodeCache:
+    # Jinja runs the marshalled code it finds there, so the directory must be
+    # private: it is created 0700, and refused if it is a symlink, belongs to
+    # another user or is writable by anyone else.
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    owner = os.getuid() if hasattr(os, "getuid") else info.st_uid
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != owner or info.st_mode & 0o022:
+        raise ValueError(f"JINJA_CACHE_DIR {directory} must be a directory only this user can write to.")
+    return FileSystemBytecodeCache(directory)
+
+
+if JINJA_CACHE_DIR:
+    app.jinja_options = {**app.jinja_options, "bytecode_cache": template_cache(JINJA_CACHE_DIR)}
+
+API_MAX_BATCH = int(os.getenv("API_MAX_BATCH", "10000"))
+SESSION_STORE = session_store_from_env()
+
+
+# Pure results are memoized by input; FX lookups are not, since rates change.
+statistics_cached = MEMO.wrap(text_statistics)
+cipher_cached = MEMO.wrap(TEXT_JOBS.cipher_transform)
+crack_cached = MEMO.wrap(crack_cipher)
+fuel_cached = MEMO.wrap(convert_fuel_consumption)
+scientific_cached = MEMO.wrap(convert_scientific_prefix)
+
+
+def finite_number(value) -> float:
+    # float() also accepts "nan" and "inf", which no tool can convert and JSON
+    # cannot represent, and overflows on huge JSON integers.
+    try:
+        number = float(value)
+    except OverflowError:
+        raise ValueError("Values must be finite numbers.")
+    if not math.isfinite(number):
+        raise ValueError("Values must be finite numbers.")
+    return number
+
 
 def base_context() -> dict:
     return {
@@ -30,6 +94,7 @@ def base_context() -> dict:
         "currency_amount": "",
         "currency_from": "USD",
         "currency_to": "EUR",
+        "currency_date": "",
         "currency_result": None,
         "currency_rate": None,
         "currency_source": "",
@@ -60,6 +125,7 @@ TOOL_FIELDS = {
         "currency_amount",
         "currency_from",
         "currency_to",
+        "currency_date",
         "currency_result",
         "currency_rate",
         "currency_source",
@@ -79,34 +145,161 @@ TOOL_FIELDS = {
 }
 
 
+def session_id() -> str:
+    if "sid" not in session:
+        session["sid"] = secrets.token_urlsafe(16)
+    return session["sid"]
+
+
+@timed(histogram=PHASE_SECONDS, label="session_load")
 def get_context() -> dict:
-    context = session.get("context")
-    if not context:
-        context = base_context()
-    defaults = base_context()
-    defaults.update(context)
-    return defaults
+    # The cookie only carries a session id; per-tool state lives in SESSION_STORE.
+    # Cookies from before the store still hold the whole context, so drop it.
+    session.pop("context", None)
+    context = base_context()
+    sid = session.get("sid")
+    if sid:
+        for fields in SESSION_STORE.load(sid).values():
+            context.update(fields)
+    g.saved_context = dict(context)
+    return context
 
 
+@timed(histogram=PHASE_SECONDS, label="session_save")
 def save_context(context: dict) -> None:
-    session["context"] = context
+    if "saved_context" not in g:
+        get_context()
+    saved = g.saved_context
+    defaults = base_context()
+
+    for tool, fields in TOOL_FIELDS.items():
+        if all(context[field] == saved[field] for field in fields):
+            continue
+        state = {field: context[field] for field in fields if context[field] != defaults[field]}
+        SESSION_STORE.save(session_id(), tool, state)
+    g.saved_context = dict(context)
+
+
+@timed(histogram=PHASE_SECONDS, label="render")
+def render(template: str, context: dict) -> str:
+    return render_template(template, **context)
+
+
+def render_page(tool: str, context: dict):
+    # Enhanced clients ask for just the panel they submitted; everyone else
+    # gets the full page.
+    if tool in TOOL_FIELDS and request.headers.get("X-Fragment") == tool:
+        response = app.make_response(render(f"tools/{tool}.html", context))
+        response.headers["X-Fragment"] = tool
+    else:
+        response = app.make_response(render("index.html", context))
+    response.vary.add("X-Fragment")
+    return response
+
+
+if METRICS_ENABLED:
+
+    @app.before_request
+    def start_request_timer() -> None:
+        g.request_started = perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            REQUEST_SECONDS.observe(perf_counter() - started, (route, request.method, response.status_code))
+        return response
+
+
+@app.before_request
+def start_profiler() -> None:
+    # A no-op unless PROFILE_TOKEN is set and the request presents it.
+    mode = requested_mode(request.headers, request.args)
+    if mode is not None:
+        g.profiler = RequestProfiler(mode)
+        g.profiler.start()
+
+
+@app.after_request
+def finish_profiler(response):
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        response.headers["X-Profile-Artifact"] = profiler.finish(request.endpoint or "unmatched")
+    return response
+
+
+@app.teardown_request
+def stop_abandoned_profiler(exc) -> None:
+    # after_request is skipped when a view raises; still stop and save the profile.
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.finish(request.endpoint or "unmatched")
+
+
+@app.after_request
+def compress_response(response):
+    # Streamed bodies (uploads, job results) and precompressed assets are left alone.
+    if response.mimetype not in COMPRESSIBLE_TYPES or response.is_streamed or response.direct_passthrough:
+        return response
+    response.vary.add("Accept-Encoding")
+    if "Content-Encoding" in response.headers or response.status_code != 200:
+        return response
+    data = response.get_data()
+    encoding = request.accept_encodings.best_match(ENCODINGS)
+    if encoding is not None and len(data) >= COMPRESS_MIN_BYTES:
+        response.set_data(compress(data, encoding))
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+
+@app.template_global()
+def asset_url(name: str) -> str:
+    return url_for("asset", name=ASSETS.url_name(name))
+
+
+@app.get("/assets/<name>")
+def asset(name: str):
+    found = ASSETS.get(name)
+    if found is None:
+        return Response("Not found.", status=404, mimetype="text/plain")
+    encoding = request.accept_encodings.best_match(found.encodings) or "identity"
+    response = Response(found.variants[encoding], mimetype=found.mimetype)
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    response.set_etag(found.etag(encoding))
+    response.vary.add("Accept-Encoding")
+    response.cache_control.public = True
+    response.cache_control.max_age = ASSET_MAX_AGE
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+
+@app.get("/metrics")
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
 
 
 @app.get("/")
 def home():
     context = get_context()
     save_context(context)
-    return render_template("index.html", **context)
+    return render("index.html", context)
 
 
 @app.post("/analyze")
 def analyze():
     text = request.form.get("text", "")
-    summary = summarize_text(text)
+    # Large documents keep block state per session, so resubmitting an edited
+    # copy only recounts the blocks the edit touched.
+    if len(text) < ANALYSIS_MIN_CHARS:
+        summary = statistics_cached(text)
+    else:
+        summary = ANALYSIS.analyze(session_id(), text)
     context = get_context()
     context.update({"text": text, "summary": summary})
     save_context(context)
-    return render_template("index.html", **context)
+    return render_page("analyze", context)
 
 
 @app.post("/cipher")
@@ -117,7 +310,12 @@ def cipher():
     cipher_key = request.form.get("cipher_key", "")
 
     try:
-        output = cipher_transform(cipher_type, cipher_mode, cipher_text, cipher_key)
+        if cipher_mode == "crack":
+            # Show what was found: the detected cipher and its key fill the form.
+            cracked = crack_cached(cipher_type, cipher_text)
+            output, cipher_type, cipher_key = cracked["plaintext"], cracked["cipher_type"], cracked["key"]
+        else:
+            output = cipher_cached(cipher_type, cipher_mode, cipher_text, cipher_key)
         error = None
     except ValueError as exc:
         output = ""
@@ -135,7 +333,7 @@ def cipher():
         }
     )
     save_context(context)
-    return render_template("index.html", **context)
+    return render_page("cipher", context)
 
 
 @app.post("/currency")
@@ -143,9 +341,14 @@ def currency():
     amount_raw = request.form.get("currency_amount", "")
     currency_from = request.form.get("currency_from", "USD")
     currency_to = request.form.get("currency_to", "EUR")
+    currency_date = request.form.get("currency_date", "").strip()
     try:
-        rate, source, last_updated = get_fx_rate_with_fallback(currency_from, currency_to)
-        converted = convert_currency(float(amount_raw), rate)
+        if currency_date:
+            rate, last_updated = get_historical_fx_rate(currency_from, currency_to, currency_date)
+            source = "Historical snapshot"
+        else:
+            rate, source, last_updated = get_fx_rate_with_fallback(currency_from, currency_to)
+        converted = convert_currency(finite_number(amount_raw), rate)
         currency_error = None
     except ValueError as exc:
         converted, rate, source, last_updated = None, None, "", ""
@@ -157,6 +360,7 @@ def currency():
             "currency_amount": amount_raw,
             "currency_from": currency_from,
             "currency_to": currency_to,
+            "currency_date": currency_date,
             "currency_result": converted,
             "currency_rate": rate,
             "currency_source": source,
@@ -165,7 +369,7 @@ def currency():
         }
     )
     save_context(context)
-    return render_template("index.html", **context)
+    return render_page("currency", context)
 
 
 @app.post("/fuel")
@@ -174,7 +378,7 @@ def fuel():
     fuel_from_unit = request.form.get("fuel_from_unit", "mpg_us")
     fuel_to_unit = request.form.get("fuel_to_unit", "km_per_l")
     try:
-        fuel_output = convert_fuel_consumption(float(fuel_value_raw), fuel_from_unit, fuel_to_unit)
+        fuel_output = fuel_cached(finite_number(fuel_value_raw), fuel_from_unit, fuel_to_unit)
         fuel_error = None
     except ValueError as exc:
         fuel_output = None
@@ -191,7 +395,7 @@ def fuel():
         }
     )
     save_context(context)
-    return render_template("index.html", **context)
+    return render_page("fuel", context)
 
 
 @app.post("/date-counter")
@@ -215,7 +419,7 @@ def date_counter():
         }
     )
     save_context(context)
-    return render_template("index.html", **context)
+    return render_page("date-counter", context)
 
 
 @app.post("/scientific")
@@ -224,9 +428,7 @@ def scientific():
     sci_from_prefix = request.form.get("sci_from_prefix", "base")
     sci_to_prefix = request.form.get("sci_to_prefix", "mega")
     try:
-        sci_converted, sci_notation = convert_scientific_prefix(
-            float(sci_value_raw), sci_from_prefix, sci_to_prefix
-        )
+        sci_converted, sci_notation = scientific_cached(finite_number(sci_value_raw), sci_from_prefix, sci_to_prefix)
         sci_error = None
     except ValueError as exc:
         sci_converted, sci_notation = None, ""
@@ -244,7 +446,213 @@ def scientific():
         }
     )
     save_context(context)
-    return render_template("index.html", **context)
+    return render_page("scientific", context)
+
+
+REQUIRED = object()
+
+API_TOOLS = {
+    "analyze": (summarize_text, {"text": (str, REQUIRED)}),
+    "cipher": (
+        cipher_transform,
+        {
+            "cipher_type": (str, REQUIRED),
+            "mode": (str, "encode"),
+            "text": (str, REQUIRED),
+            "key": (str, ""),
+        },
+    ),
+    "fuel": (
+        convert_fuel_consumption,
+        {"value": (finite_number, REQUIRED), "from_unit": (str, REQUIRED), "to_unit": (str, REQUIRED)},
+    ),
+    "date-counter": (
+        count_date_distance,
+        {"reference_date": (str, REQUIRED), "target_date": (str, REQUIRED)},
+    ),
+    "scientific": (
+        convert_scientific_prefix,
+        {"value": (finite_number, REQUIRED), "from_prefix": (str, REQUIRED), "to_prefix": (str, REQUIRED)},
+    ),
+}
+
+
+def api_arguments(item, fields: dict, defaults: dict) -> dict:
+    if not isinstance(item, dict):
+        raise ValueError("Each item must be a JSON object.")
+    arguments = {}
+    for name, (parse, default) in fields.items():
+        value = item.get(name, defaults.get(name, default))
+        if value is REQUIRED:
+            raise ValueError(f"Missing field '{name}'.")
+        if isinstance(value, (dict, list)) or value is None:
+            raise ValueError(f"Field '{name}' must be a string or number.")
+        arguments[name] = parse(value)
+    return arguments
+
+
+def api_result(tool: str, result):
+    if tool == "scientific":
+        converted, notation = result
+        result = {"converted": converted, "notation": notation}
+    # Finite inputs can still overflow, e.g. 1e300 base units in pico; jsonify
+    # would write Infinity, which is not JSON.
+    values = result.values() if isinstance(result, dict) else (result,)
+    if any(isinstance(value, float) and not math.isfinite(value) for value in values):
+        raise ValueError("The result is too large to represent.")
+    return result
+
+
+@app.post("/api/v1/<tool>")
+def api_batch(tool: str):
+    if tool not in API_TOOLS:
+        return jsonify({"error": f"Unknown tool '{tool}'."}), 404
+
+    body = request.get_json(silent=True)
+    defaults = {}
+    if isinstance(body, dict):
+        defaults = body.get("defaults") or {}
+        body = body.get("items")
+    if not isinstance(body, list) or not isinstance(defaults, dict):
+        return jsonify({"error": "Send a JSON array of items or an object with an 'items' array."}), 400
+    if len(body) > API_MAX_BATCH:
+        return jsonify({"error": f"Batches are limited to {API_MAX_BATCH} items."}), 413
+
+    func, fields = API_TOOLS[tool]
+    # Per-call timing would cost more than cheap conversions themselves, so a
+    # batch is observed once, as the api_batch phase.
+    func = getattr(func, "__wrapped__", func)
+    results = []
+    errors = []
+    started = perf_counter()
+    for index, item in enumerate(body):
+        try:
+            results.append(api_result(tool, func(**api_arguments(item, fields, defaults))))
+        except ValueError as exc:
+            results.append(None)
+            errors.append({"index": index, "error": str(exc)})
+    PHASE_SECONDS.observe(perf_counter() - started, ("api_batch",))
+    return jsonify({"tool": tool, "count": len(results), "results": results, "errors": errors})
+
+
+def upload_source(text_field: str = ""):
+    # Multipart uploads are spooled to disk by Werkzeug; any other body is read
+    # straight from the (possibly chunked) request stream. A browser form posts
+    # an unnamed, empty file part when no file was chosen; the text in its
+    # text_field is then used instead.
+    if request.mimetype == "multipart/form-data":
+        upload = request.files.get("file")
+        if upload is not None and upload.filename:
+            return upload.stream, request.form
+        text = request.form.get(text_field, "") if text_field else ""
+        if not text:
+            raise ValueError("Attach a text file in the 'file' field.")
+        return text, request.form
+    return request.stream, request.args
+
+
+@app.post("/stream/analyze")
+def stream_analyze():
+    try:
+        source, _ = upload_source()
+        summary = summarize_stream(source)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    return jsonify(summary)
+
+
+@app.post("/stream/cipher")
+def stream_cipher():
+    try:
+        source, params = upload_source("cipher_text")
+        cipher_type = params.get("cipher_type", "caesar")
+        if params.get("cipher_mode") == "crack":
+            raise ValueError("Crack mode needs the whole text at once; use Run Cipher instead.")
+        cipher_mode = "decode" if params.get("cipher_mode") == "decode" else "encode"
+        chunks = cipher_stream(cipher_type, cipher_mode, source, params.get("cipher_key", ""))
+        # Pull the first chunk now so undecodable input still gets a 400.
+        first = next(chunks, "")
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    body = (chunk.encode("utf-8") for chunk in chain([first], chunks))
+    response = Response(stream_with_context(body), mimetype="text/plain")
+    response.headers["Content-Disposition"] = f'attachment; filename="{cipher_type}-{cipher_mode}.txt"'
+    return response
+
+
+def job_status(meta: dict) -> dict:
+    status = {name: meta[name] for name in ("id", "kind", "status", "bytes_total", "bytes_processed", "error")}
+    status["progress"] = round(meta["bytes_processed"] / meta["bytes_total"], 4) if meta["bytes_total"] else 1.0
+    status["status_url"] = url_for("job_detail", job_id=meta["id"])
+    status["result_url"] = url_for("job_result", job_id=meta["id"])
+    return status
+
+
+@app.post("/api/v1/jobs/<kind>")
+def job_submit(kind: str):
+    try:
+        source, params = upload_source()
+        fields = ("cipher_type", "cipher_mode", "cipher_key") if kind == "cipher" else ()
+        meta = JOB_QUEUE.submit(kind, source, {name: params[name] for name in fields if name in params})
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    response = jsonify(job_status(meta))
+    response.status_code = 202
+    response.headers["Location"] = url_for("job_detail", job_id=meta["id"])
+    return response
+
+
+@app.get("/api/v1/jobs/<job_id>")
+def job_detail(job_id: str):
+    meta = JOB_QUEUE.status(job_id)
+    if meta is None:
+        return jsonify({"error": "Unknown or expired job."}), 404
+    return jsonify(job_status(meta))
+
+
+@app.get("/api/v1/jobs/<job_id>/result")
+def job_result(job_id: str):
+    meta = JOB_QUEUE.status(job_id)
+    if meta is None:
+        return jsonify({"error": "Unknown or expired job."}), 404
+    if meta["status"] == "failed":
+        return jsonify({"error": meta["error"]}), 422
+    if meta["status"] != "done":
+        return jsonify(job_status(meta)), 409
+    if meta["kind"] == "analyze":
+        return jsonify(meta["result"])
+
+    response = Response(JOB_QUEUE.iter_result(meta), mimetype="text/plain")
+    response.headers["Content-Disposition"] = f'attachment; filename="{job_id}.txt"'
+    return response
+
+
+@app.get("/api/v1/fx-cache")
+def fx_cache_stats():
+    return jsonify(fx_cache().stats())
+
+
+@app.get("/api/v1/analysis")
+def analysis_stats():
+    return jsonify(ANALYSIS.stats())
+
+
+@app.get("/api/v1/memo")
+def memo_stats():
+    return jsonify(MEMO.stats())
+
+
+def memo_metrics():
+    stats = MEMO.stats()
+    events = ("hits", "disk_hits", "misses", "evictions", "oversized")
+    yield "memo_events_total", "counter", "Memoized toolkit lookups by outcome.", [
+        (("event",), (event,), stats[event]) for event in events
+    ]
+    yield "memo_bytes", "gauge", "Estimated size of memoized results.", [((), (), stats["bytes"])]
+
+
+register_collector(memo_metrics)
 
 
 @app.post("/clear")
@@ -255,17 +663,36 @@ def clear_tool():
     for field in TOOL_FIELDS.get(tool, []):
         context[field] = defaults[field]
     save_context(context)
-    return render_template("index.html", **context)
+    return render_page(tool, context)
 
 
 @app.post("/clear-all")
 def clear_all():
     context = base_context()
     save_context(context)
-    return render_template("index.html", **context)
+    return render("index.html", context)
+
+
+WARM_UP_TEXT = "The quick brown fox jumps over the lazy dog 0123456789"
+WARM_UP_KEYS = {"caesar": "3", "atbash": "", "rot13": "", "vigenere": "lemon", "morse": ""}
+
+
+def warm_up() -> None:
+    # gunicorn.conf.py calls this in the master before forking, so workers share
+    # compiled templates, the FX module and NumPy copy-on-write instead of
+    # loading them on their first request. Untimed on purpose: an observation
+    # made here would be inherited, and reported, by every worker.
+    for name in app.jinja_env.list_templates(extensions=["html"]):
+        app.jinja_env.get_template(name)
+    fx_cache()
+    JOB_QUEUE.start_cleanup()
+    for cipher_type, key in WARM_UP_KEYS.items():
+        encoded = "".join(cipher_stream(cipher_type, "encode", WARM_UP_TEXT, key))
+        "".join(cipher_stream(cipher_type, "decode", encoded, key))
 
 
 if __name__ == "__main__":
     host = os.getenv("HOST", "127.0.0.1")
     port = int(os.getenv("PORT", "5050"))
-    app.run(debug=True, host=host, port=port)
+    # Assets are read once at startup, so the reloader also watches them.
+    app.run(debug=True, host=host, port=port, extra_files=ASSETS.paths())
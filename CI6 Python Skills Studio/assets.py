@@ -0,0 +1,83 @@
+import gzip
+import os
+from hashlib import blake2b
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; responses are then gzip-compressed only.
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+ASSET_TYPES = {".css": "text/css", ".js": "text/javascript"}
+ASSET_MAX_AGE = 365 * 24 * 3600
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+COMPRESSIBLE_TYPES = frozenset({"text/html", "text/plain", "text/css", "text/javascript", "application/json"})
+
+# Preferred first when the client accepts both equally.
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def compress(data: bytes, encoding: str, level: int = COMPRESS_LEVEL) -> bytes:
+    if encoding == "br":
+        # Brotli quality runs 0-11; map the gzip-style 1-9 level onto it.
+        return brotli.compress(data, quality=min(11, level * 11 // 9))
+    # mtime=0 keeps the output, and therefore the ETag, stable across restarts.
+    return gzip.compress(data, level, mtime=0)
+
+
+class Asset:
+    # One static file, named after a hash of its contents, with every encoding
+    # computed up front. Variants that do not come out smaller are dropped.
+    def __init__(self, name: str, data: bytes, mimetype: str) -> None:
+        self.name = name
+        self.mimetype = mimetype
+        self.digest = blake2b(data, digest_size=8).hexdigest()
+        stem, extension = os.path.splitext(name)
+        self.url_name = f"{stem}.{self.digest}{extension}"
+        self.variants = {"identity": data}
+        for encoding in ENCODINGS:
+            compressed = compress(data, encoding, 9)
+            if len(compressed) < len(data):
+                self.variants[encoding] = compressed
+
+    @property
+    def encodings(self) -> list[str]:
+        return [encoding for encoding in ENCODINGS if encoding in self.variants]
+
+    def etag(self, encoding: str) -> str:
+        # Each encoding is a different byte sequence, so each gets its own strong tag.
+        return self.digest if encoding == "identity" else f"{self.digest}-{encoding}"
+
+
+class AssetManifest:
+    # Reads the static files once at startup. Fingerprinted URLs change whenever
+    # a file does, which is what lets responses be cached as immutable.
+    def __init__(self, directory: str = STATIC_DIR) -> None:
+        self.directory = directory
+        self._by_name: dict[str, Asset] = {}
+        self._by_url_name: dict[str, Asset] = {}
+        for name in sorted(os.listdir(directory)):
+            mimetype = ASSET_TYPES.get(os.path.splitext(name)[1])
+            if mimetype is None:
+                continue
+            with open(os.path.join(directory, name), "rb") as handle:
+                asset = Asset(name, handle.read(), mimetype)
+            self._by_name[name] = asset
+            self._by_url_name[asset.url_name] = asset
+
+    def url_name(self, name: str) -> str:
+        asset = self._by_name.get(name)
+        if asset is None:
+            raise ValueError(f"Unknown static asset: {name}")
+        return asset.url_name
+
+    def get(self, url_name: str) -> Optional[Asset]:
+        return self._by_url_name.get(url_name)
+
+    def paths(self) -> list[str]:
+        return [os.path.join(self.directory, name) for name in self._by_name]
+
+
+ASSETS = AssetManifest()
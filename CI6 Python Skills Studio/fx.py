@@ -0,0 +1,351 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from http.client import HTTPConnection, HTTPSConnection, RemoteDisconnected
+from time import perf_counter, time
+from typing import Callable, Optional
+from urllib.parse import quote, urlsplit
+
+from sqlite_wal import ThreadConnections
+
+YAHOO_BASE_URL = os.getenv("FX_YAHOO_BASE_URL", "https://query1.finance.yahoo.com")
+FX_HTTP_TIMEOUT_SECONDS = 8
+FX_POOL_MAX_IDLE = 4
+FX_CACHE_BACKEND = os.getenv("FX_CACHE_BACKEND", "memory")
+FX_CACHE_PATH = os.getenv("FX_CACHE_PATH", os.path.join(tempfile.gettempdir(), "ci6-fx-cache.sqlite3"))
+
+
+class ConnectionPool:
+    # Keeps idle keep-alive connections per (scheme, host, port) so repeated
+    # FX lookups skip the TCP and TLS handshakes.
+    def __init__(self, max_idle: int = FX_POOL_MAX_IDLE, timeout: float = FX_HTTP_TIMEOUT_SECONDS) -> None:
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.connections_opened = 0
+        self._idle: dict[tuple, list[HTTPConnection]] = {}
+        self._lock = threading.Lock()
+
+    def _checkout(self, origin: tuple) -> tuple[HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(origin)
+            if idle:
+                return idle.pop(), True
+            self.connections_opened += 1
+        scheme, host, port = origin
+        connection_class = HTTPSConnection if scheme == "https" else HTTPConnection
+        return connection_class(host, port, timeout=self.timeout), False
+
+    def _checkin(self, origin: tuple, connection: HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(origin, [])
+            if len(idle) < self.max_idle:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def get(self, url: str, headers: dict) -> tuple[int, str, bytes]:
+        parts = urlsplit(url)
+        origin = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+
+        while True:
+            connection, reused = self._checkout(origin)
+            try:
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                connection.close()
+                if reused:
+                    # The server dropped an idle keep-alive connection; retry on a fresh one.
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+
+            if response.will_close:
+                connection.close()
+            else:
+                self._checkin(origin, connection)
+            return response.status, response.reason, body
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    # Concurrent callers asking for the same key share one in-flight call.
+    def __init__(self) -> None:
+        self._flights: dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, func, *args):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func(*args)
+            return flight.result
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+
+def parse_yahoo_chart(body: bytes) -> float:
+    try:
+        payload = json.loads(body.decode("utf-8"))
+    except Exception:
+        raise ValueError("Could not read Yahoo Finance response.")
+
+    try:
+        result = payload["chart"]["result"][0]
+        meta = result["meta"]
+        price = meta.get("regularMarketPrice") or meta.get("previousClose")
+    except (KeyError, IndexError, TypeError, AttributeError):
+        raise ValueError("Unexpected Yahoo Finance data format.")
+
+    if not isinstance(price, (int, float)) or price <= 0:
+        raise ValueError("Yahoo Finance returned an invalid exchange rate.")
+    return float(price)
+
+
+class YahooFXProvider:
+    def __init__(self, base_url: str = YAHOO_BASE_URL, pool: Optional[ConnectionPool] = None) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.pool = pool or ConnectionPool()
+        self.flights = SingleFlight()
+        self.upstream_requests = 0
+
+    def fetch(self, from_code: str, to_code: str) -> float:
+        return self.flights.do(f"{from_code}:{to_code}", self._fetch, from_code, to_code)
+
+    def _fetch(self, from_code: str, to_code: str) -> float:
+        symbol = f"{from_code}{to_code}=X"
+        url = f"{self.base_url}/v8/finance/chart/{quote(symbol)}"
+        self.upstream_requests += 1
+        try:
+            status, reason, body = self.pool.get(
+                url,
+                {"User-Agent": "Mozilla/5.0", "Accept": "application/json"},
+            )
+        except OSError as exc:
+            raise ValueError(f"Could not reach Yahoo Finance: {exc}")
+        except Exception:
+            raise ValueError("Could not read Yahoo Finance response.")
+
+        if status != 200:
+            raise ValueError(f"Could not reach Yahoo Finance: {reason or status}")
+        return parse_yahoo_chart(body)
+
+
+YAHOO_PROVIDER = YahooFXProvider()
+
+
+class SQLiteRateStore:
+    # Shared (rate, timestamp) table so every gunicorn worker sees rates fetched
+    # by any other worker. WAL mode lets readers proceed while one writer updates.
+    def __init__(self, path: str = FX_CACHE_PATH) -> None:
+        self.path = path
+        self._connections = ThreadConnections(
+            path,
+            "CREATE TABLE IF NOT EXISTS fx_rates "
+            "(key TEXT PRIMARY KEY, rate REAL NOT NULL, fetched_at REAL NOT NULL)",
+        )
+        self._connections.get()
+
+    def get(self, key: str) -> Optional[tuple[float, float]]:
+        try:
+            cursor = self._connections.get().execute("SELECT rate, fetched_at FROM fx_rates WHERE key = ?", (key,))
+            row = cursor.fetchone()
+        except sqlite3.Error:
+            return None
+        return (row[0], row[1]) if row else None
+
+    def set(self, key: str, entry: tuple[float, float]) -> None:
+        # Last writer wins only if its rate is newer, so a slow worker cannot
+        # overwrite a fresher rate another worker already stored.
+        try:
+            self._connections.get().execute(
+                "INSERT INTO fx_rates (key, rate, fetched_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET rate = excluded.rate, fetched_at = excluded.fetched_at "
+                "WHERE excluded.fetched_at > fx_rates.fetched_at",
+                (key, entry[0], entry[1]),
+            )
+        except sqlite3.Error:
+            pass
+
+
+def rate_store_from_env() -> Optional[SQLiteRateStore]:
+    if FX_CACHE_BACKEND == "memory":
+        return None
+    if FX_CACHE_BACKEND == "sqlite":
+        return SQLiteRateStore(FX_CACHE_PATH)
+    raise ValueError("FX_CACHE_BACKEND must be 'memory' or 'sqlite'.")
+
+
+class FXCache:
+    # Bounded LRU of (rate, timestamp) entries. Entries older than ttl are still
+    # served for up to max_stale seconds while one background refresh runs.
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl: float = 600,
+        max_stale: float = 3600,
+        store: Optional[SQLiteRateStore] = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.store = store
+        self._entries: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._refreshing: dict[str, threading.Thread] = {}
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(
+            ["hits", "shared_hits", "misses", "stale_serves", "evictions", "refreshes", "refresh_errors", "fetches"],
+            0,
+        )
+        self._fetch_seconds_total = 0.0
+        self._fetch_seconds_max = 0.0
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._entries))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, key: str) -> Optional[tuple[float, float]]:
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key: str, entry: tuple[float, float]) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_load(self, key: str, loader: Callable[[], float]) -> tuple[float, float, bool]:
+        now = time()
+        entry = self.get(key)
+        if self.store is not None and (entry is None or now - entry[1] >= self.ttl):
+            shared = self.store.get(key)
+            if shared is not None and (entry is None or shared[1] > entry[1]):
+                self.set(key, shared)
+                if now - shared[1] < self.ttl:
+                    self._count("shared_hits")
+                    return shared[0], shared[1], False
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                age = now - entry[1]
+                if age < self.ttl:
+                    self._counters["hits"] += 1
+                    return entry[0], entry[1], False
+                if age < self.ttl + self.max_stale:
+                    self._counters["stale_serves"] += 1
+                    self._refresh_in_background(key, loader)
+                    return entry[0], entry[1], False
+            self._counters["misses"] += 1
+
+        rate, fetched_at = self._load(key, loader)
+        return rate, fetched_at, True
+
+    def _load(self, key: str, loader: Callable[[], float]) -> tuple[float, float]:
+        started = perf_counter()
+        try:
+            rate = loader()
+        finally:
+            elapsed = perf_counter() - started
+            with self._lock:
+                self._counters["fetches"] += 1
+                self._fetch_seconds_total += elapsed
+                self._fetch_seconds_max = max(self._fetch_seconds_max, elapsed)
+        entry = (rate, time())
+        self.set(key, entry)
+        if self.store is not None:
+            self.store.set(key, entry)
+        return entry
+
+    def _refresh_in_background(self, key: str, loader: Callable[[], float]) -> None:
+        # Called with the lock held.
+        if key in self._refreshing:
+            return
+        thread = threading.Thread(target=self._refresh, args=(key, loader), daemon=True)
+        self._refreshing[key] = thread
+        thread.start()
+
+    def _refresh(self, key: str, loader: Callable[[], float]) -> None:
+        try:
+            self._load(key, loader)
+            self._count("refreshes")
+        except Exception:
+            self._count("refresh_errors")
+        finally:
+            with self._lock:
+                self._refreshing.pop(key, None)
+
+    def wait_for_refreshes(self, timeout: Optional[float] = None) -> None:
+        with self._lock:
+            threads = list(self._refreshing.values())
+        for thread in threads:
+            thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["size"] = len(self._entries)
+            stats["max_entries"] = self.max_entries
+            stats["fetch_seconds_total"] = round(self._fetch_seconds_total, 6)
+            stats["fetch_seconds_max"] = round(self._fetch_seconds_max, 6)
+        stats["backend"] = "sqlite" if self.store is not None else "memory"
+        served = stats["hits"] + stats["shared_hits"] + stats["stale_serves"]
+        lookups = served + stats["misses"]
+        stats["hit_ratio"] = round(served / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,219 @@
+import csv
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_right
+from datetime import date
+from time import time
+from typing import IO, Optional
+
+FX_ARCHIVE_PATH = os.getenv(
+    "FX_ARCHIVE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "fx-archive.bin")
+)
+FX_ARCHIVE_CHECK_SECONDS = 5
+
+# File layout, little-endian: the header, then three fixed-width columns, each
+# padded to a multiple of 8 bytes: 3-byte currency codes, int32 day ordinals in
+# ascending order, and float64 USD-based rates, one row of codes per date.
+ARCHIVE_MAGIC = b"CI6FXA1\n"
+HEADER = struct.Struct("<8sII")
+
+
+def _padded(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def _currency_code(value: str) -> str:
+    code = value.strip().upper()
+    if len(code) != 3 or not code.isascii() or not code.isalpha():
+        raise ValueError(f"Invalid currency code '{value}'.")
+    return code
+
+
+class FXArchive:
+    # A memory-mapped archive file. Lookups bisect the date column in place, so
+    # they take microseconds and no memory beyond the mapping, whatever its size.
+    def __init__(self, path: str) -> None:
+        if sys.byteorder != "little":
+            raise ValueError("FX archives can only be read on little-endian machines.")
+        try:
+            with open(path, "rb") as handle:
+                # mmap refuses empty files and unpack_from short ones, with
+                # errors the FX fallback path would not expect.
+                if os.fstat(handle.fileno()).st_size < HEADER.size:
+                    raise ValueError("FX snapshot archive is truncated.")
+                self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError as exc:
+            raise ValueError(f"FX snapshot archive is unavailable: {exc.strerror}.")
+        magic, currency_count, date_count = HEADER.unpack_from(self._map)
+        if magic != ARCHIVE_MAGIC:
+            raise ValueError("Not an FX snapshot archive.")
+
+        codes_at = HEADER.size
+        ordinals_at = codes_at + _padded(3 * currency_count)
+        rates_at = ordinals_at + _padded(4 * date_count)
+        if len(self._map) < rates_at + 8 * date_count * currency_count:
+            raise ValueError("FX snapshot archive is truncated.")
+        codes = self._map[codes_at : codes_at + 3 * currency_count].decode("ascii")
+        self.currencies = {codes[index * 3 : index * 3 + 3]: index for index in range(currency_count)}
+        view = memoryview(self._map)
+        self._ordinals = view[ordinals_at : ordinals_at + 4 * date_count].cast("i")
+        self._rates = view[rates_at : rates_at + 8 * date_count * currency_count].cast("d")
+
+    def __len__(self) -> int:
+        return len(self._ordinals)
+
+    def snapshot_date(self, row: int) -> date:
+        return date.fromordinal(self._ordinals[row])
+
+    def row_for(self, on: date) -> int:
+        # The latest snapshot taken on or before the given day.
+        row = bisect_right(self._ordinals, on.toordinal()) - 1
+        if row < 0:
+            raise ValueError(f"No FX snapshot on or before {on.isoformat()}.")
+        return row
+
+    def usd_rate(self, code: str, row: int) -> float:
+        if code == "USD":
+            return 1.0
+        index = self.currencies.get(code)
+        rate = self._rates[row * len(self.currencies) + index] if index is not None else float("nan")
+        if rate != rate:
+            raise ValueError(f"The {self.snapshot_date(row).isoformat()} snapshot does not include {code}.")
+        return rate
+
+    def cross_rate(self, from_code: str, to_code: str, on: date) -> tuple[float, date]:
+        row = self.row_for(on)
+        return self.usd_rate(to_code, row) / self.usd_rate(from_code, row), self.snapshot_date(row)
+
+    def snapshots(self) -> dict[date, dict[str, float]]:
+        codes = sorted(self.currencies, key=self.currencies.get)
+        result = {}
+        for row in range(len(self)):
+            values = self._rates[row * len(codes) : (row + 1) * len(codes)]
+            result[self.snapshot_date(row)] = {code: rate for code, rate in zip(codes, values) if rate == rate}
+        return result
+
+    def close(self) -> None:
+        self._ordinals.release()
+        self._rates.release()
+        self._map.close()
+
+
+def write_archive(path: str, snapshots: dict[date, dict[str, float]]) -> None:
+    # Currencies missing from a date carry their previous rate forward, so a
+    # lookup never has to walk back through older rows.
+    if not snapshots:
+        raise ValueError("No FX snapshots to write.")
+    codes = sorted({code for rates in snapshots.values() for code in rates})
+    days = sorted(snapshots)
+    ordinals = array("i", (day.toordinal() for day in days))
+    rates = array("d")
+    latest = [float("nan")] * len(codes)
+    for day in days:
+        for index, code in enumerate(codes):
+            if code in snapshots[day]:
+                latest[index] = snapshots[day][code]
+        rates.extend(latest)
+    if sys.byteorder != "little":
+        ordinals.byteswap()
+        rates.byteswap()
+
+    encoded_codes = "".join(codes).encode("ascii")
+    with open(path + ".tmp", "wb") as handle:
+        handle.write(HEADER.pack(ARCHIVE_MAGIC, len(codes), len(days)))
+        for column in (encoded_codes, ordinals.tobytes(), rates.tobytes()):
+            handle.write(column + b"\0" * (_padded(len(column)) - len(column)))
+    os.replace(path + ".tmp", path)
+
+
+def read_csv(handle: IO[str]) -> dict[date, dict[str, float]]:
+    # A header row "date,EUR,GBP,..." and one row per day of USD-based rates
+    # (units of each currency per US dollar). Empty cells are skipped.
+    reader = csv.reader(handle)
+    header = next(reader, None)
+    if not header or header[0].strip().lower() != "date":
+        raise ValueError("The CSV must start with a 'date' column followed by currency codes.")
+    codes = [_currency_code(value) for value in header[1:]]
+    snapshots: dict[date, dict[str, float]] = {}
+    for line, row in enumerate(reader, start=2):
+        if not row or not "".join(row).strip():
+            continue
+        try:
+            day = date.fromisoformat(row[0].strip())
+            rates = {code: float(value) for code, value in zip(codes, row[1:]) if value.strip()}
+        except ValueError:
+            raise ValueError(f"Line {line}: use YYYY-MM-DD dates and numeric rates.")
+        if any(not rate > 0 for rate in rates.values()):
+            raise ValueError(f"Line {line}: rates must be greater than 0.")
+        snapshots.setdefault(day, {}).update(rates)
+    return snapshots
+
+
+class ArchiveLoader:
+    # Opens the archive on first use and reopens it after the file is replaced,
+    # checking at most every check_seconds. get() returns None without a file.
+    def __init__(self, path: str = FX_ARCHIVE_PATH, check_seconds: float = FX_ARCHIVE_CHECK_SECONDS) -> None:
+        self.path = path
+        self.check_seconds = check_seconds
+        self._archive: Optional[FXArchive] = None
+        self._stamp: Optional[tuple] = None
+        self._checked = float("-inf")
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[FXArchive]:
+        now = time()
+        if now - self._checked < self.check_seconds:
+            return self._archive
+        with self._lock:
+            self._checked = now
+            try:
+                info = os.stat(self.path)
+            except OSError:
+                self._archive = self._stamp = None
+                return None
+            stamp = (info.st_ino, info.st_mtime_ns, info.st_size)
+            if stamp != self._stamp:
+                # The old mapping is left to the garbage collector, since other
+                # threads may still be reading from it.
+                self._archive = FXArchive(self.path)
+                self._stamp = stamp
+            return self._archive
+
+
+FX_ARCHIVE = ArchiveLoader()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import USD-based FX snapshots from a CSV file into the archive.")
+    parser.add_argument("csv", help="CSV with a 'date' column and one column per currency code")
+    parser.add_argument("--archive", default=FX_ARCHIVE_PATH)
+    parser.add_argument("--replace", action="store_true", help="drop existing snapshots instead of merging")
+    args = parser.parse_args(argv)
+
+    snapshots = {}
+    try:
+        if not args.replace and os.path.exists(args.archive):
+            archive = FXArchive(args.archive)
+            snapshots = archive.snapshots()
+            archive.close()
+        with open(args.csv, newline="", encoding="utf-8") as handle:
+            imported = read_csv(handle)
+        for day, rates in imported.items():
+            snapshots.setdefault(day, {}).update(rates)
+        os.makedirs(os.path.dirname(os.path.abspath(args.archive)), exist_ok=True)
+        write_archive(args.archive, snapshots)
+    except (OSError, ValueError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 1
+    print(f"Imported {len(imported)} dates; {args.archive} now holds {len(snapshots)} dates.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
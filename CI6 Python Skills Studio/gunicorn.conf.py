@@ -0,0 +1,20 @@
+import os
+
+# gunicorn reads this file from the working directory, so the Procfile needs no
+# flags. With preload the app is imported and warmed up once in the master, and
+# forked workers start with everything already in memory.
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") != "0"
+
+
+def when_ready(server):
+    if preload_app:
+        from app import warm_up
+
+        warm_up()
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        from app import warm_up
+
+        warm_up()
@@ -0,0 +1,248 @@
+import json
+import os
+import re
+import secrets
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep, time
+from typing import IO, Iterator, Optional
+
+from toolkit import STREAM_CHUNK_SIZE, TextSummarizer, cipher_stream, iter_text_chunks
+
+JOB_DIR = os.getenv("JOB_DIR", os.path.join(tempfile.gettempdir(), "ci6-jobs"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "3600"))
+JOB_QUEUED_TTL_SECONDS = int(os.getenv("JOB_QUEUED_TTL_SECONDS", str(24 * 3600)))
+JOB_SPILL_BYTES = int(os.getenv("JOB_SPILL_BYTES", str(1024 * 1024)))
+JOB_PROGRESS_INTERVAL = 0.25
+JOB_CLEANUP_INTERVAL = 60
+
+JOB_KINDS = ("analyze", "cipher")
+JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+
+class JobQueue:
+    # Every job is a set of files in one directory: <id>.json holds status and
+    # small results, <id>.in the spooled input and <id>.out a large output.
+    # Any process on the host can therefore answer status and result requests,
+    # whichever gunicorn worker is running the job.
+    def __init__(
+        self,
+        directory: str = JOB_DIR,
+        workers: int = JOB_WORKERS,
+        ttl: float = JOB_TTL_SECONDS,
+        spill_bytes: int = JOB_SPILL_BYTES,
+        queued_ttl: float = JOB_QUEUED_TTL_SECONDS,
+    ) -> None:
+        self.directory = directory
+        self.workers = workers
+        self.ttl = ttl
+        self.spill_bytes = spill_bytes
+        self.queued_ttl = queued_ttl
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._sweeper_pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.{suffix}")
+
+    def _pool(self) -> ThreadPoolExecutor:
+        self.start_cleanup()
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+                self._pid = os.getpid()
+            return self._executor
+
+    def start_cleanup(self) -> None:
+        # A daemon thread per process runs cleanup() every JOB_CLEANUP_INTERVAL,
+        # so jobs also expire on a server that receives no new ones.
+        with self._lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+        threading.Thread(target=self._sweep, name="job-cleanup", daemon=True).start()
+
+    def _sweep(self) -> None:
+        while True:
+            sleep(JOB_CLEANUP_INTERVAL)
+            self.cleanup()
+
+    def _write_meta(self, meta: dict) -> None:
+        meta["updated_at"] = time()
+        path = self._path(meta["id"], "json")
+        with open(path + ".tmp", "w", encoding="utf-8") as handle:
+            json.dump(meta, handle)
+        os.replace(path + ".tmp", path)
+
+    def submit(self, kind: str, source: IO[bytes], params: dict) -> dict:
+        if kind not in JOB_KINDS:
+            raise ValueError("Unknown job type.")
+        if kind == "cipher":
+            # Reject bad cipher settings now rather than after the upload is queued.
+            # Given an empty stream, cipher_stream checks them without producing
+            # anything; crack mode is refused, as it needs the whole text at once.
+            cipher_stream(
+                params.get("cipher_type", "caesar"),
+                params.get("cipher_mode", "encode"),
+                iter(()),
+                params.get("cipher_key", ""),
+            )
+
+        self.cleanup()
+        job_id = secrets.token_hex(16)
+        with open(self._path(job_id, "in"), "wb") as handle:
+            shutil.copyfileobj(source, handle, STREAM_CHUNK_SIZE)
+
+        meta = {
+            "id": job_id,
+            "kind": kind,
+            "params": params,
+            "status": "queued",
+            "bytes_total": os.path.getsize(self._path(job_id, "in")),
+            "bytes_processed": 0,
+            "created_at": time(),
+            "error": None,
+            "result": None,
+            "spilled": False,
+        }
+        self._write_meta(meta)
+        self._pool().submit(self._run, meta)
+        return meta
+
+    def status(self, job_id: str) -> Optional[dict]:
+        if not JOB_ID.fullmatch(job_id):
+            return None
+        try:
+            with open(self._path(job_id, "json"), encoding="utf-8") as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return None
+
+    def _read_input(self, meta: dict, handle: IO[bytes]) -> Iterator[bytes]:
+        last_report = time()
+        for piece in iter(lambda: handle.read(STREAM_CHUNK_SIZE), b""):
+            yield piece
+            meta["bytes_processed"] += len(piece)
+            if time() - last_report >= JOB_PROGRESS_INTERVAL:
+                self._write_meta(meta)
+                last_report = time()
+
+    def _run(self, meta: dict) -> None:
+        job_id = meta["id"]
+        meta["status"] = "running"
+        self._write_meta(meta)
+        try:
+            with open(self._path(job_id, "in"), "rb") as handle:
+                chunks = self._read_input(meta, handle)
+                if meta["kind"] == "analyze":
+                    summarizer = TextSummarizer()
+                    for chunk in iter_text_chunks(chunks):
+                        summarizer.feed(chunk)
+                    meta["result"] = summarizer.result()
+                else:
+                    params = meta["params"]
+                    output = cipher_stream(
+                        params.get("cipher_type", "caesar"),
+                        params.get("cipher_mode", "encode"),
+                        chunks,
+                        params.get("cipher_key", ""),
+                    )
+                    self._store_output(meta, output)
+            meta["status"] = "done"
+        except ValueError as exc:
+            meta["status"] = "failed"
+            meta["error"] = str(exc)
+        except Exception:
+            meta["status"] = "failed"
+            meta["error"] = "The job could not be completed."
+        finally:
+            leftovers = ("in", "out") if meta["status"] == "failed" else ("in",)
+            for suffix in leftovers:
+                try:
+                    os.remove(self._path(job_id, suffix))
+                except OSError:
+                    pass
+            meta["spilled"] = meta["spilled"] and meta["status"] == "done"
+            self._write_meta(meta)
+
+    def _store_output(self, meta: dict, output: Iterator[str]) -> None:
+        # Output stays in the status file until it passes spill_bytes, then the
+        # rest is written straight to <id>.out.
+        buffered: list[bytes] = []
+        size = 0
+        spill = None
+        try:
+            for chunk in output:
+                data = chunk.encode("utf-8")
+                size += len(data)
+                if spill is not None:
+                    spill.write(data)
+                    continue
+                buffered.append(data)
+                if size > self.spill_bytes:
+                    spill = open(self._path(meta["id"], "out"), "wb")
+                    spill.writelines(buffered)
+                    buffered = []
+        finally:
+            if spill is not None:
+                spill.close()
+        meta["output_bytes"] = size
+        if spill is not None:
+            meta["spilled"] = True
+        else:
+            meta["result"] = b"".join(buffered).decode("utf-8")
+
+    def iter_result(self, meta: dict) -> Iterator[bytes]:
+        if not meta["spilled"]:
+            yield meta["result"].encode("utf-8")
+            return
+        with open(self._path(meta["id"], "out"), "rb") as handle:
+            yield from iter(lambda: handle.read(STREAM_CHUNK_SIZE), b"")
+
+    def cleanup(self, now: Optional[float] = None) -> int:
+        # Drop jobs whose status file has not changed for the TTL. A running job
+        # rewrites it every JOB_PROGRESS_INTERVAL, so one that stops for that
+        # long lost its worker. Queued jobs only wait, and get queued_ttl.
+        # Runs at most once per JOB_CLEANUP_INTERVAL.
+        now = time() if now is None else now
+        with self._lock:
+            if now - self._last_cleanup < JOB_CLEANUP_INTERVAL:
+                return 0
+            self._last_cleanup = now
+
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return 0
+        removed = 0
+        for name in names:
+            job_id, _, suffix = name.partition(".")
+            if suffix != "json" or not JOB_ID.fullmatch(job_id):
+                continue
+            meta = self.status(job_id)
+            if meta is not None:
+                ttl = self.queued_ttl if meta["status"] == "queued" else self.ttl
+                if now - meta["updated_at"] < ttl:
+                    continue
+            for suffix in ("json", "in", "out"):
+                try:
+                    os.remove(self._path(job_id, suffix))
+                except OSError:
+                    pass
+            removed += 1
+        return removed
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+JOB_QUEUE = JobQueue()
@@ -0,0 +1,204 @@
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from hashlib import blake2b
+from time import time
+from typing import Callable, Optional, TypeVar
+
+from sqlite_wal import ThreadConnections
+
+MEMO_MAX_BYTES = int(os.getenv("MEMO_MAX_BYTES", str(64 * 1024 * 1024)))
+MEMO_BACKEND = os.getenv("MEMO_BACKEND", "memory")
+MEMO_PATH = os.getenv("MEMO_PATH", os.path.join(tempfile.gettempdir(), "ci6-memo.sqlite3"))
+MEMO_DISK_MAX_BYTES = int(os.getenv("MEMO_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
+# Bump when a memoized function changes its output, so old entries stop matching.
+MEMO_VERSION = b"1"
+
+T = TypeVar("T")
+
+
+def memo_key(name: str, args: tuple) -> bytes:
+    # Arguments are length-prefixed, so ("ab", "c") and ("a", "bc") differ.
+    digest = blake2b(MEMO_VERSION + b"\0" + name.encode("utf-8"), digest_size=16)
+    for arg in args:
+        data = arg.encode("utf-8") if isinstance(arg, str) else repr(arg).encode("utf-8")
+        digest.update(type(arg).__name__.encode("ascii") + b":%d:" % len(data))
+        digest.update(data)
+    return digest.digest()
+
+
+def value_size(value) -> int:
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+    elif isinstance(value, (tuple, list)):
+        size += sum(sys.getsizeof(item) for item in value)
+    return size
+
+
+def _dump(value) -> str:
+    # JSON rather than pickle: the shared file must never be able to run code.
+    if isinstance(value, tuple):
+        return json.dumps(["tuple", list(value)])
+    return json.dumps(["value", value])
+
+
+def _load(text: str):
+    kind, value = json.loads(text)
+    return tuple(value) if kind == "tuple" else value
+
+
+class SQLiteMemoStore:
+    # Disk tier shared by every worker on the host. Once the stored bytes pass
+    # max_bytes, the oldest entries are deleted.
+    def __init__(self, path: str = MEMO_PATH, max_bytes: int = MEMO_DISK_MAX_BYTES) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self._connections = ThreadConnections(
+            path,
+            "CREATE TABLE IF NOT EXISTS memo "
+            "(key BLOB PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, stored_at REAL NOT NULL)",
+        )
+        self._writes = 0
+        self._connections.get()
+
+    def get(self, key: bytes):
+        try:
+            row = self._connections.get().execute("SELECT value FROM memo WHERE key = ?", (key,)).fetchone()
+            return _load(row[0]) if row else None
+        except (sqlite3.Error, ValueError):
+            return None
+
+    def set(self, key: bytes, value) -> None:
+        try:
+            text = _dump(value)
+            connection = self._connections.get()
+            connection.execute(
+                "INSERT OR REPLACE INTO memo (key, value, size, stored_at) VALUES (?, ?, ?, ?)",
+                (key, text, len(text), time()),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self.trim()
+        except (sqlite3.Error, TypeError, ValueError):
+            pass
+
+    def trim(self) -> None:
+        connection = self._connections.get()
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM memo").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        rows = connection.execute("SELECT key, size FROM memo ORDER BY stored_at")
+        doomed = []
+        for key, size in rows:
+            if excess <= 0:
+                break
+            doomed.append((key,))
+            excess -= size
+        connection.executemany("DELETE FROM memo WHERE key = ?", doomed)
+
+
+def memo_store_from_env() -> Optional[SQLiteMemoStore]:
+    if MEMO_BACKEND == "memory":
+        return None
+    if MEMO_BACKEND == "sqlite":
+        return SQLiteMemoStore(MEMO_PATH, MEMO_DISK_MAX_BYTES)
+    raise ValueError("MEMO_BACKEND must be 'memory' or 'sqlite'.")
+
+
+class MemoCache:
+    # Results of pure toolkit calls keyed by a hash of (function, arguments).
+    # The LRU is bounded by the estimated size of the stored results rather than
+    # their number; one result may use at most an eighth of the budget. Only
+    # deterministic functions belong here: FX lookups depend on the clock.
+    def __init__(self, max_bytes: int = MEMO_MAX_BYTES, store: Optional[SQLiteMemoStore] = None) -> None:
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // 8
+        self.store = store
+        self._entries: OrderedDict[bytes, tuple[object, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(["hits", "disk_hits", "misses", "evictions", "oversized"], 0)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _get(self, key: bytes):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return entry[0]
+        if self.store is not None:
+            value = self.store.get(key)
+            if value is not None:
+                self._set(key, value)
+                with self._lock:
+                    self._counters["disk_hits"] += 1
+                return value
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def _set(self, key: bytes, value) -> bool:
+        size = value_size(value)
+        with self._lock:
+            if size > self.max_entry_bytes:
+                self._counters["oversized"] += 1
+                return False
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._counters["evictions"] += 1
+        return True
+
+    def memoize(self, name: str, args: tuple, compute: Callable[[], T]) -> T:
+        key = memo_key(name, args)
+        value = self._get(key)
+        if value is None:
+            value = compute()
+            if self._set(key, value) and self.store is not None:
+                self.store.set(key, value)
+        # Callers may keep or change a returned dict; never hand out the cached one.
+        return dict(value) if isinstance(value, dict) else value
+
+    def wrap(self, func: Callable[..., T]) -> Callable[..., T]:
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        def memoized(*args):
+            return self.memoize(name, args, lambda: func(*args))
+
+        memoized.__wrapped__ = func
+        return memoized
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+            stats["max_bytes"] = self.max_bytes
+        stats["backend"] = "sqlite" if self.store is not None else "memory"
+        served = stats["hits"] + stats["disk_hits"]
+        lookups = served + stats["misses"]
+        stats["hit_ratio"] = round(served / lookups, 4) if lookups else 0.0
+        return stats
+
+
+MEMO = MemoCache(MEMO_MAX_BYTES, memo_store_from_env())
@@ -0,0 +1,186 @@
+import functools
+import os
+import threading
+from bisect import bisect_left
+from time import perf_counter
+from typing import Callable, Iterable, Optional
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SHARD_PRUNE_THRESHOLD = 64
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    # Fixed buckets, one shard per thread: observe() only touches the calling
+    # thread's lists, so the hot path takes no lock. Shards of finished threads
+    # are folded into a retired total when collected or when many pile up.
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets=LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.bounds = tuple(buckets)
+        self._local = threading.local()
+        self._shards: list[tuple[threading.Thread, dict]] = []
+        self._retired: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                if len(self._shards) >= SHARD_PRUNE_THRESHOLD:
+                    self._fold_dead_shards()
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def observe(self, value: float, labels: tuple = ()) -> None:
+        shard = self._shard()
+        cells = shard.get(labels)
+        if cells is None:
+            # One count per bucket plus +Inf, then the running sum.
+            cells = shard[labels] = [0] * (len(self.bounds) + 1) + [0.0]
+        cells[bisect_left(self.bounds, value)] += 1
+        cells[-1] += value
+
+    def _fold_dead_shards(self) -> None:
+        # Called with the lock held.
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                _merge_cells(self._retired, shard)
+        self._shards = alive
+
+    def collect(self) -> dict[tuple, list]:
+        with self._lock:
+            self._fold_dead_shards()
+            merged = {labels: list(cells) for labels, cells in self._retired.items()}
+            for _, shard in self._shards:
+                _merge_cells(merged, dict(shard))
+        return merged
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, cells in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), cells):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {cells[-1]!r}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+def _merge_cells(target: dict, shard: dict) -> None:
+    for labels, cells in shard.items():
+        total = target.get(labels)
+        if total is None:
+            target[labels] = list(cells)
+        else:
+            for index, value in enumerate(cells):
+                total[index] += value
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_number(value)}")
+        return lines
+
+
+# A collector returns (name, type, help, [(labelnames, labelvalues, value), ...])
+# tuples for values that already live elsewhere, read at scrape time.
+Sample = tuple[str, str, str, list[tuple[tuple, tuple, float]]]
+REGISTRY: list = []
+COLLECTORS: list[Callable[[], Iterable[Sample]]] = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def register_collector(collector: Callable[[], Iterable[Sample]]) -> None:
+    COLLECTORS.append(collector)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.expose())
+    for collector in COLLECTORS:
+        for name, kind, documentation, samples in collector():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labelnames, labelvalues, value in samples:
+                lines.append(f"{name}{_format_labels(labelnames, labelvalues)} {_format_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = register(
+    Histogram("http_request_duration_seconds", "Time spent handling a request.", ("route", "method", "status"))
+)
+PHASE_SECONDS = register(
+    Histogram("app_phase_duration_seconds", "Time spent in session load/save and template rendering.", ("phase",))
+)
+FUNCTION_SECONDS = register(
+    Histogram("toolkit_function_duration_seconds", "Time spent in toolkit functions.", ("function",))
+)
+FX_FALLBACKS = register(Counter("fx_snapshot_fallbacks_total", "FX lookups answered from the built-in snapshot."))
+
+
+def timed(func: Optional[Callable] = None, *, histogram: Histogram = FUNCTION_SECONDS, label: Optional[str] = None):
+    # Usable bare (@timed) or configured (@timed(histogram=..., label=...)).
+    # With METRICS_ENABLED=0 functions are returned unwrapped.
+    def decorate(func: Callable) -> Callable:
+        if not METRICS_ENABLED:
+            return func
+        labels = (label or func.__name__,)
+        observe = histogram.observe
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(perf_counter() - started, labels)
+
+        return wrapper
+
+    return decorate(func) if func is not None else decorate
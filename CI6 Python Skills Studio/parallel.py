@@ -0,0 +1,121 @@
+import os
+import re
+import threading
+from itertools import accumulate
+from typing import TYPE_CHECKING, Optional
+
+from toolkit import (
+    cipher_transform,
+    morse_encode,
+    vigenere_cipher,
+    vigenere_key_shifts,
+    vigenere_letter_count,
+)
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+PARALLEL_THRESHOLD = int(os.getenv("PARALLEL_THRESHOLD", str(8 * 1024 * 1024)))
+PARALLEL_CHUNK_SIZE = int(os.getenv("PARALLEL_CHUNK_SIZE", str(2 * 1024 * 1024)))
+PARALLEL_WORKERS = int(os.getenv("PARALLEL_WORKERS", "0")) or os.cpu_count() or 1
+
+MORSE_SEPARATOR = re.compile(r"[\s/]")
+
+
+def split_text(text: str, chunk_size: int, boundary: Optional[re.Pattern] = None) -> list[str]:
+    # With a boundary pattern each cut is moved forward to just after the next
+    # match, so no token is split between two chunks.
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + chunk_size
+        if boundary is not None and end < len(text):
+            match = boundary.search(text, end - 1)
+            end = match.end() if match else len(text)
+        chunks.append(text[start:end])
+        start = end
+    return chunks
+
+
+class TextJobExecutor:
+    # Runs large cipher and analyzer jobs on a process pool, one chunk per task,
+    # so a single big input does not hold a request thread for seconds. Inputs
+    # below the threshold, and ciphers that are a single str.translate pass,
+    # stay inline because shipping them to another process costs more.
+    def __init__(
+        self,
+        threshold: int = PARALLEL_THRESHOLD,
+        chunk_size: int = PARALLEL_CHUNK_SIZE,
+        workers: int = PARALLEL_WORKERS,
+    ) -> None:
+        self.threshold = threshold
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self._executor: Optional["ProcessPoolExecutor"] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> "ProcessPoolExecutor":
+        # Created lazily and per process, so each gunicorn worker gets its own;
+        # multiprocessing is only imported once a large input shows up.
+        from concurrent.futures import ProcessPoolExecutor
+
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _map(self, func, *iterables, chunksize: int = 1) -> list:
+        from concurrent.futures.process import BrokenProcessPool
+
+        try:
+            return list(self._pool().map(func, *iterables, chunksize=chunksize))
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); drop the pool and finish inline.
+            self.shutdown()
+            return list(map(func, *iterables))
+
+    def map_blocks(self, func, blocks: list[str]) -> list:
+        # func(block) for every block, on the pool once the blocks add up to the
+        # threshold. Tasks carry about chunk_size characters of blocks each.
+        total = sum(len(block) for block in blocks)
+        if total < self.threshold:
+            return [func(block) for block in blocks]
+        return self._map(func, blocks, chunksize=max(1, self.chunk_size * len(blocks) // total))
+
+    def cipher_transform(self, cipher_type: str, mode: str, text: str, key: str = "") -> str:
+        if len(text) < self.threshold or cipher_type not in ("vigenere", "morse") or mode == "crack":
+            return cipher_transform(cipher_type, mode, text, key)
+
+        if cipher_type == "vigenere":
+            decode = mode == "decode"
+            period = len(vigenere_key_shifts(key, decode))
+            chunks = split_text(text, self.chunk_size)
+            counts = [vigenere_letter_count(chunk) for chunk in chunks[:-1]]
+            offsets = [count % period for count in accumulate(counts, initial=0)]
+            n = len(chunks)
+            return "".join(self._map(vigenere_cipher, chunks, [key] * n, [decode] * n, offsets))
+
+        if mode == "decode":
+            # Cutting right after a separator keeps every Morse token whole.
+            chunks = split_text(text, self.chunk_size, MORSE_SEPARATOR)
+            return "".join(self._map(cipher_transform, ["morse"] * len(chunks), ["decode"] * len(chunks), chunks))
+
+        chunks = split_text(text, self.chunk_size)
+        encoded = self._map(morse_encode, chunks)
+        # Same joining rule as morse_encode_stream: letters that meet across a
+        # cut still need their separating space.
+        for index in range(1, len(chunks)):
+            if not chunks[index - 1].endswith(" ") and not chunks[index].startswith(" "):
+                encoded[index] = " " + encoded[index]
+        return "".join(encoded)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+TEXT_JOBS = TextJobExecutor()
@@ -0,0 +1,107 @@
+import cProfile
+import os
+import secrets
+import sys
+import tempfile
+import threading
+from collections import Counter
+from time import time
+from typing import Mapping, Optional
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "ci6-profiles"))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+
+PROFILE_MODES = ("cprofile", "sample")
+
+
+def requested_mode(headers: Mapping, args: Mapping, token: Optional[str] = None) -> Optional[str]:
+    # Profiling is only honored when PROFILE_TOKEN is configured and the request
+    # carries the same token, in the X-Profile header or the ?profile= flag.
+    token = PROFILE_TOKEN if token is None else token
+    if not token:
+        return None
+    supplied = headers.get("X-Profile") or args.get("profile") or ""
+    if not secrets.compare_digest(supplied.encode("utf-8"), token.encode("utf-8")):
+        return None
+    mode = headers.get("X-Profile-Mode") or args.get("profile_mode") or "cprofile"
+    return mode if mode in PROFILE_MODES else "cprofile"
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class StackSampler:
+    # Snapshots one thread's Python stack every interval from a helper thread and
+    # counts identical stacks, which is the collapsed format flame graph tools read.
+    def __init__(self, thread_id: int, interval: float = PROFILE_SAMPLE_INTERVAL) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            if labels:
+                self.stacks[";".join(reversed(labels))] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as handle:
+            for stack, count in self.stacks.most_common():
+                handle.write(f"{stack} {count}\n")
+
+
+# From Python 3.12 cProfile runs on sys.monitoring, which allows one active
+# profiler per process, so only one request at a time gets cProfile.
+_CPROFILE_LOCK = threading.Lock()
+
+
+class RequestProfiler:
+    def __init__(self, mode: str, directory: Optional[str] = None) -> None:
+        self.mode = mode
+        self.directory = directory or PROFILE_DIR
+        self._profiler = None
+
+    def start(self) -> None:
+        # Requests that overlap a cProfile run are sampled instead, since the
+        # sampler only reads stacks and any number of them can run at once.
+        if self.mode == "cprofile" and _CPROFILE_LOCK.acquire(blocking=False):
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+            return
+        self.mode = "sample"
+        self._profiler = StackSampler(threading.get_ident())
+        self._profiler.start()
+
+    def finish(self, name: str) -> str:
+        # Stops profiling and writes <ms timestamp>-<name>-<pid>.prof (pstats) or
+        # .folded (collapsed stacks); returns the file name.
+        if self.mode == "sample":
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+            _CPROFILE_LOCK.release()
+        suffix = "folded" if self.mode == "sample" else "prof"
+        filename = f"{int(time() * 1000)}-{name}-{os.getpid()}.{suffix}"
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, filename)
+        if self.mode == "sample":
+            self._profiler.write(path)
+        else:
+            self._profiler.dump_stats(path)
+        return filename
@@ -0,0 +1,118 @@
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from time import time
+from typing import Union
+
+from sqlite_wal import ThreadConnections
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_PATH = os.getenv("SESSION_PATH", os.path.join(tempfile.gettempdir(), "ci6-sessions.sqlite3"))
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+
+
+def state_size(fields: dict) -> int:
+    return sum(sys.getsizeof(name) + sys.getsizeof(value) for name, value in fields.items())
+
+
+class MemorySessionStore:
+    # sid -> {tool: non-default fields}, least recently used sessions evicted
+    # first. Pasted texts make sessions vary wildly in size, so the store is
+    # bounded by the estimated size of the fields as well as by the number of
+    # sessions; one tool's state may use at most an eighth of the budget.
+    def __init__(self, max_entries: int = SESSION_MAX_ENTRIES, max_bytes: int = SESSION_MAX_BYTES) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_state_bytes = max_bytes // 8
+        self._sessions: OrderedDict[str, dict[str, dict]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def load(self, sid: str) -> dict[str, dict]:
+        with self._lock:
+            tools = self._sessions.get(sid)
+            if tools is None:
+                return {}
+            self._sessions.move_to_end(sid)
+            return {tool: dict(fields) for tool, fields in tools.items()}
+
+    def save(self, sid: str, tool: str, fields: dict) -> None:
+        size = state_size(fields)
+        with self._lock:
+            tools = self._sessions.setdefault(sid, {})
+            self._sessions.move_to_end(sid)
+            self._bytes -= state_size(tools.pop(tool, {}))
+            # An oversized state is dropped, so that tool starts from its defaults.
+            if fields and size <= self.max_state_bytes:
+                tools[tool] = dict(fields)
+                self._bytes += size
+            while len(self._sessions) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._sessions.popitem(last=False)
+                self._bytes -= sum(state_size(state) for state in evicted.values())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    @property
+    def bytes(self) -> int:
+        with self._lock:
+            return self._bytes
+
+
+class SQLiteSessionStore:
+    # One row per (sid, tool), so saving a tool rewrites only that tool's fields.
+    def __init__(self, path: str = SESSION_PATH, ttl: int = SESSION_TTL_SECONDS) -> None:
+        self.path = path
+        self.ttl = ttl
+        self._connections = ThreadConnections(
+            path,
+            "CREATE TABLE IF NOT EXISTS session_state "
+            "(sid TEXT NOT NULL, tool TEXT NOT NULL, state TEXT NOT NULL, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (sid, tool))",
+        )
+        self._writes = 0
+        self._connections.get()
+
+    def load(self, sid: str) -> dict[str, dict]:
+        # A store that cannot be read starts every tool from its defaults.
+        try:
+            rows = self._connections.get().execute(
+                "SELECT tool, state FROM session_state WHERE sid = ? AND updated_at > ?",
+                (sid, time() - self.ttl),
+            )
+            return {tool: json.loads(state) for tool, state in rows}
+        except (sqlite3.Error, ValueError):
+            return {}
+
+    def save(self, sid: str, tool: str, fields: dict) -> None:
+        try:
+            connection = self._connections.get()
+            if fields:
+                connection.execute(
+                    "INSERT INTO session_state (sid, tool, state, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(sid, tool) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+                    (sid, tool, json.dumps(fields, separators=(",", ":")), time()),
+                )
+            else:
+                connection.execute("DELETE FROM session_state WHERE sid = ? AND tool = ?", (sid, tool))
+
+            self._writes += 1
+            if self._writes % 1000 == 0:
+                connection.execute("DELETE FROM session_state WHERE updated_at <= ?", (time() - self.ttl,))
+        except (sqlite3.Error, TypeError, ValueError):
+            pass
+
+
+def session_store_from_env() -> Union[MemorySessionStore, SQLiteSessionStore]:
+    if SESSION_BACKEND == "memory":
+        return MemorySessionStore(SESSION_MAX_ENTRIES, SESSION_MAX_BYTES)
+    if SESSION_BACKEND == "sqlite":
+        return SQLiteSessionStore(SESSION_PATH, SESSION_TTL_SECONDS)
+    raise ValueError("SESSION_BACKEND must be 'memory' or 'sqlite'.")
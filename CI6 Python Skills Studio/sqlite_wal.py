@@ -0,0 +1,23 @@
+import os
+import sqlite3
+import threading
+
+
+class ThreadConnections:
+    # One WAL-mode connection per thread, so readers never wait on the writer,
+    # and reopened after a fork: a connection must not be used across processes.
+    # Every SQLite-backed store on the host shares these settings.
+    def __init__(self, path: str, schema: str) -> None:
+        self.path = path
+        self.schema = schema
+        self._local = threading.local()
+
+    def get(self) -> sqlite3.Connection:
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(self.schema)
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
@@ -0,0 +1,43 @@
+// Progressive enhancement: submit tool forms in the background and swap in
+// only the returned panel. Without JavaScript the forms post normally.
+(function () {
+  if (!window.fetch || !window.FormData) {
+    return;
+  }
+
+  document.addEventListener("submit", function (event) {
+    var form = event.target;
+    var card = form.closest("[data-tool]");
+    var submitter = event.submitter;
+    if (!card || (submitter && submitter.hasAttribute("data-download"))) {
+      return;
+    }
+    event.preventDefault();
+
+    var action = (submitter && submitter.getAttribute("formaction")) || form.getAttribute("action");
+    var body = new FormData(form);
+    if (submitter) {
+      submitter.disabled = true;
+    }
+
+    fetch(action, {
+      method: "POST",
+      body: body,
+      credentials: "same-origin",
+      headers: { "X-Fragment": card.getAttribute("data-tool") },
+    })
+      .then(function (response) {
+        if (!response.ok || response.headers.get("X-Fragment") !== card.getAttribute("data-tool")) {
+          throw new Error("Fragment request failed");
+        }
+        return response.text();
+      })
+      .then(function (html) {
+        card.outerHTML = html;
+      })
+      .catch(function () {
+        form.setAttribute("action", action);
+        form.submit();
+      });
+  });
+})();
@@ -0,0 +1,357 @@
+import argparse
+import atexit
+import gc
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+from time import perf_counter
+
+APP_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(APP_DIR))
+
+import toolkit
+from analysis import IncrementalAnalyzer
+
+SAMPLE = "The quick brown fox jumps over the lazy dog, again and again! "
+VIGENERE_TARGET_SPEEDUP = 20
+SIZES = {"1k": 1024, "1m": 1024 * 1024, "50m": 50 * 1024 * 1024}
+DEFAULT_SIZES = "1k,1m"
+BASELINE_PATH = Path(__file__).with_name("bench_baseline.json")
+DEFAULT_TOLERANCE = 0.25
+MIN_TIMING = 0.05
+
+
+def reference_vigenere(text: str, key: str, decode: bool = False) -> str:
+    letters = [c.lower() for c in key if c.isalpha()]
+    output = []
+    key_index = 0
+    for ch in text:
+        if ch.isalpha():
+            k = ord(letters[key_index % len(letters)]) - ord("a")
+            shift = -k if decode else k
+            base = "A" if ch.isupper() else "a"
+            output.append(chr(ord(base) + ((ord(ch) - ord(base) + shift) % 26)))
+            key_index += 1
+        else:
+            output.append(ch)
+    return "".join(output)
+
+
+def best_time(func, repeat: int = 3) -> float:
+    # Like timeit, collection is paused so GC pauses do not land in one sample.
+    timings = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = perf_counter()
+            func()
+            timings.append(perf_counter() - started)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return min(timings)
+
+
+def per_call_time(func, repeat: int) -> float:
+    # Short calls are looped so each timing covers at least MIN_TIMING seconds.
+    loops = max(1, int(MIN_TIMING / max(best_time(func, 1), 1e-9)))
+    return best_time(lambda: [func() for _ in range(loops)], repeat) / loops
+
+
+def peak_memory(func) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def sample_text(size: int) -> str:
+    return (SAMPLE * (size // len(SAMPLE) + 1))[:size]
+
+
+def date_pairs(size: int) -> list[tuple[str, str]]:
+    # One pair is about 20 bytes of input, so sizes stay comparable with text.
+    pairs = []
+    for index in range(max(1, size // 20)):
+        pairs.append((f"{2000 + index % 50}-{index % 12 + 1:02d}-{index % 28 + 1:02d}", "2026-02-16"))
+    return pairs
+
+
+def function_cases(size: int) -> dict:
+    text = sample_text(size)
+    morse = toolkit.morse_encode(text)
+    pairs = date_pairs(size)
+
+    # Alternates between two versions of the text, so every call re-analyzes an edit.
+    analyzer = IncrementalAnalyzer(min_chars=0)
+    edited = text[: size // 2] + " One edited sentence. " + text[size // 2 :]
+    analyzer.analyze("bench", text)
+
+    def reanalyze():
+        analyzer.analyze("bench", edited)
+        analyzer.analyze("bench", text)
+
+    def date_loop():
+        # Results are dropped as they come so peak memory reflects one call.
+        for reference, target in pairs:
+            toolkit.count_date_distance(reference, target)
+
+    return {
+        "caesar_cipher": (lambda: toolkit.caesar_cipher(text, 3), size),
+        "vigenere_cipher": (lambda: toolkit.vigenere_cipher(text, "LEMON"), size),
+        "morse_encode": (lambda: toolkit.morse_encode(text), size),
+        "morse_decode": (lambda: toolkit.morse_decode(morse), len(morse)),
+        "summarize_text": (lambda: toolkit.summarize_text(text), size),
+        "text_statistics": (lambda: toolkit.text_statistics(text), size),
+        "reanalyze_edit": (reanalyze, size),
+        "count_date_distance": (date_loop, size),
+    }
+
+
+def stub_fx_fetcher(from_currency: str, to_currency: str) -> float:
+    return 0.9 if to_currency == "EUR" else 1.25
+
+
+def route_cases() -> dict:
+    # Route benchmarks run offline: FX lookups hit a stub instead of Yahoo, and
+    # jobs go to a queue in a temporary directory.
+    import app as app_module
+    from app import app
+    from assets import ASSETS
+    from jobs import JobQueue
+    from memo import MEMO
+
+    toolkit.fetch_yahoo_fx_rate = stub_fx_fetcher
+    job_dir = tempfile.mkdtemp(prefix="ci6-bench-jobs-")
+    atexit.register(shutil.rmtree, job_dir, True)
+    queue = app_module.JOB_QUEUE = JobQueue(job_dir, workers=1)
+    app.config.update(TESTING=True)
+    client = app.test_client()
+    text = sample_text(16 * 1024)
+    forms = {
+        "/": None,
+        "/analyze": {"text": text},
+        "/cipher": {"cipher_text": text, "cipher_type": "vigenere", "cipher_key": "lemon"},
+        "/currency": {"currency_amount": "100", "currency_from": "GBP", "currency_to": "EUR"},
+        "/fuel": {"fuel_value": "30", "fuel_from_unit": "mpg_us", "fuel_to_unit": "km_per_l"},
+        "/date-counter": {"reference_date": "2024-01-31", "target_date": "2026-02-16"},
+        "/scientific": {"sci_value": "1234.5", "sci_from_prefix": "base", "sci_to_prefix": "mega"},
+    }
+
+    def request(path, form):
+        if form is None:
+            return lambda: client.get(path)
+        if path not in ("/analyze", "/cipher", "/fuel", "/scientific"):
+            return lambda: client.post(path, data=form)
+
+        # These routes memoize their results; the cache is emptied before every
+        # request so the numbers track the work, not a dictionary lookup.
+        def uncached():
+            MEMO.clear()
+            client.post(path, data=form)
+
+        return uncached
+
+    cases = {f"route {path}": request(path, form) for path, form in forms.items()}
+    cases["route /analyze (memo hit)"] = lambda: client.post("/analyze", data=forms["/analyze"])
+    fuel_batch = [{"value": value, "from_unit": "mpg_us", "to_unit": "km_per_l"} for value in range(1, 1001)]
+    cases["route /api/v1/fuel x1000"] = lambda: client.post("/api/v1/fuel", json=fuel_batch)
+
+    def cold_currency():
+        toolkit.FX_CACHE.clear()
+        client.post("/currency", data=forms["/currency"])
+
+    cases["route /currency (cold cache)"] = cold_currency
+    cases["route /clear"] = lambda: client.post("/clear", data={"tool": "analyze"})
+    cases["route /clear-all"] = lambda: client.post("/clear-all")
+    cases["route /metrics"] = lambda: client.get("/metrics")
+    css = "/assets/" + ASSETS.url_name("app.css")
+    cases["route /assets/<name>"] = lambda: client.get(css, headers={"Accept-Encoding": "gzip"})
+
+    # Streamed bodies are read to the end, so the numbers include producing them.
+    body = text.encode("utf-8")
+    cases["route /stream/analyze"] = lambda: client.post("/stream/analyze", data=body).get_data()
+    cases["route /stream/cipher"] = lambda: client.post(
+        "/stream/cipher?cipher_type=vigenere&cipher_key=lemon", data=body
+    ).get_data()
+
+    def job_round_trip():
+        # Submit, wait for the worker, then fetch status and result like a client would.
+        job = client.post("/api/v1/jobs/analyze", data=body).get_json()
+        queue.shutdown()
+        client.get(job["status_url"])
+        client.get(job["result_url"])
+
+    cases["route /api/v1/jobs/analyze"] = job_round_trip
+    return cases
+
+
+STARTUP_SCRIPT = """
+from time import perf_counter
+
+started = perf_counter()
+from app import app
+
+imported = perf_counter()
+app.test_client().get("/")
+print(imported - started, perf_counter() - started)
+"""
+
+
+def startup_times(jinja_cache_dir: str) -> tuple[float, float]:
+    # A fresh interpreter each time, so modules already loaded here do not hide
+    # import costs. Returns (import seconds, import-to-first-response seconds).
+    env = dict(os.environ, JINJA_CACHE_DIR=jinja_cache_dir)
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT], cwd=APP_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    imported, responded = map(float, output.split())
+    return imported, responded
+
+
+def fastest(runs: list[tuple[float, float]]) -> dict:
+    return {"import_seconds": min(run[0] for run in runs), "first_response_seconds": min(run[1] for run in runs)}
+
+
+def measure_startup(repeat: int) -> dict:
+    # "startup" reuses compiled templates from an earlier run, as a restarted
+    # worker would; the cold case starts every run with an empty template cache.
+    with tempfile.TemporaryDirectory() as warm_dir:
+        startup_times(warm_dir)
+        warm = [startup_times(warm_dir) for _ in range(repeat)]
+    cold = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as cold_dir:
+            cold.append(startup_times(cold_dir))
+    return {"startup": fastest(warm), "startup (cold template cache)": fastest(cold)}
+
+
+def collect_cases(sizes: list[str]) -> dict:
+    # name -> (callable, input bytes); routes have no byte size and report req/s.
+    cases = {}
+    for label in sizes:
+        for name, case in function_cases(SIZES[label]).items():
+            cases[f"{name} {label}"] = case
+    for name, func in route_cases().items():
+        cases[name] = (func, None)
+    return cases
+
+
+def measure(func, nbytes, repeat: int, requests: int) -> dict:
+    if nbytes is None:
+        func()
+        seconds = best_time(lambda: [func() for _ in range(requests)], repeat) / requests
+        rate = {"requests_per_s": 1 / seconds}
+    else:
+        seconds = per_call_time(func, 1 if nbytes > SIZES["1m"] else repeat)
+        rate = {"mb_per_s": nbytes / 1024 / 1024 / seconds}
+    return {"seconds": seconds, **rate, "peak_bytes": peak_memory(func)}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> dict:
+    # A case regresses when its throughput drops, or its peak memory grows, by
+    # more than the tolerance. Cases missing from the baseline are skipped.
+    regressions = {}
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in ("mb_per_s", "requests_per_s"):
+            if metric in current and current[metric] < previous[metric] * (1 - tolerance):
+                regressions[name] = f"{metric} {current[metric]:.1f} < baseline {previous[metric]:.1f}"
+        for metric in ("import_seconds", "first_response_seconds"):
+            if metric in current and current[metric] > previous[metric] * (1 + tolerance):
+                regressions[name] = f"{metric} {current[metric]:.3f} > baseline {previous[metric]:.3f}"
+        if "peak_bytes" in current and current["peak_bytes"] > previous["peak_bytes"] * (1 + tolerance) + 64 * 1024:
+            regressions[name] = f"peak {current['peak_bytes']} B > baseline {previous['peak_bytes']} B"
+    return regressions
+
+
+def better(first: dict, second: dict) -> dict:
+    metric = "mb_per_s" if "mb_per_s" in first else "requests_per_s"
+    best = dict(first if first[metric] >= second[metric] else second)
+    best["peak_bytes"] = min(first["peak_bytes"], second["peak_bytes"])
+    return best
+
+
+def bench_vigenere(size_mb: int = 5) -> float:
+    text = sample_text(size_mb * 1024 * 1024)
+    assert toolkit.vigenere_cipher(text, "LEMON") == reference_vigenere(text, "LEMON")
+
+    baseline = best_time(lambda: reference_vigenere(text, "LEMON"), repeat=1)
+    batched = best_time(lambda: toolkit.vigenere_cipher(text, "LEMON"))
+    backend = "numpy" if toolkit.np is not None else "bytes"
+    speedup = baseline / batched
+    print(f"vigenere {size_mb} MB [{backend}]: reference {size_mb / baseline:.1f} MB/s, "
+          f"batched {size_mb / batched:.1f} MB/s, speedup {speedup:.1f}x")
+    return speedup
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark toolkit functions and app routes.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated input sizes: 1k, 1m, 50m")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=20, help="requests per route and round")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="write results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    sizes = [label.strip() for label in args.sizes.split(",") if label.strip()]
+    unknown = [label for label in sizes if label not in SIZES]
+    if unknown:
+        parser.error(f"unknown sizes: {', '.join(unknown)}")
+
+    cases = collect_cases(sizes)
+    results = {name: measure(func, nbytes, args.repeat, args.requests) for name, (func, nbytes) in cases.items()}
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    if not args.save:
+        # Re-measure apparent regressions once so a single noisy sample does not fail the run.
+        for name in compare(results, baseline, args.tolerance):
+            func, nbytes = cases[name]
+            results[name] = better(results[name], measure(func, nbytes, args.repeat, args.requests))
+
+    startup = measure_startup(args.repeat)
+    if not args.save and compare(startup, baseline, args.tolerance):
+        retry = measure_startup(args.repeat)
+        startup = {name: {key: min(value, retry[name][key]) for key, value in result.items()}
+                   for name, result in startup.items()}
+
+    for name, result in results.items():
+        rate = f"{result['mb_per_s']:9.1f} MB/s" if "mb_per_s" in result else f"{result['requests_per_s']:9.1f} req/s"
+        print(f"{name:40} {rate}  peak {result['peak_bytes'] / 1024:10.1f} KiB")
+
+    for name, result in startup.items():
+        print(f"{name:40} import {result['import_seconds'] * 1000:7.1f} ms  "
+              f"first response {result['first_response_seconds'] * 1000:7.1f} ms")
+    results.update(startup)
+
+    speedup = bench_vigenere()
+    failures = []
+    if toolkit.np is not None and speedup < VIGENERE_TARGET_SPEEDUP:
+        failures.append(f"vigenere speedup {speedup:.1f}x is below the {VIGENERE_TARGET_SPEEDUP}x target")
+
+    if args.save:
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"baseline written to {args.baseline}")
+    elif baseline:
+        failures += [f"{name}: {message}" for name, message in compare(results, baseline, args.tolerance).items()]
+    else:
+        print(f"no baseline at {args.baseline}; run with --save to create one")
+
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import random
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from analysis import IncrementalAnalyzer, split_blocks
+from app import app
+from parallel import TextJobExecutor
+from toolkit import text_statistics
+
+PIECES = ["Attack at dawn. ", "Héllo wörld! ", "Don't stop\n", "ΌΣΟΣ ", "the end? ", "abc", "  ", "Straße. "]
+
+
+def random_text(rng: random.Random, pieces: int) -> str:
+    return "".join(rng.choice(PIECES) for _ in range(pieces))
+
+
+def test_split_blocks_end_after_whitespace():
+    text = random_text(random.Random(1), 200)
+    blocks = split_blocks(text, 64)
+    assert "".join(blocks) == text
+    assert all(block[-1].isspace() for block in blocks[:-1])
+    assert split_blocks("", 64) == []
+
+
+def test_edits_match_a_full_pass():
+    rng = random.Random(2)
+    analyzer = IncrementalAnalyzer(block_size=32, min_chars=0)
+    text = random_text(rng, 300)
+    for _ in range(60):
+        assert analyzer.analyze("doc", text) == text_statistics(text)
+        for _ in range(rng.randint(1, 3)):
+            start = rng.randint(0, len(text))
+            stop = min(len(text), start + rng.randint(0, 40))
+            text = text[:start] + random_text(rng, rng.randint(0, 3)) + text[stop:]
+    # Without a key the text is still counted block by block, just not kept.
+    assert analyzer.analyze(None, text) == text_statistics(text)
+    assert analyzer.stats()["documents"] == 1
+
+
+def test_large_builds_run_on_the_process_pool():
+    jobs = TextJobExecutor(threshold=1024, chunk_size=256, workers=2)
+    analyzer = IncrementalAnalyzer(block_size=64, min_chars=0, jobs=jobs)
+    text = random_text(random.Random(4), 400)
+    try:
+        assert analyzer.analyze("doc", text) == text_statistics(text)
+        assert jobs._executor is not None
+    finally:
+        jobs.shutdown()
+
+
+def test_small_edit_reuses_blocks():
+    analyzer = IncrementalAnalyzer(block_size=64, min_chars=0)
+    text = random_text(random.Random(3), 2000)
+    analyzer.analyze("doc", text)
+    counted = analyzer.stats()["blocks_counted"]
+
+    middle = len(text) // 2
+    edited = text[:middle] + " Inserted words here. " + text[middle:]
+    edited = edited[:100] + edited[110:]
+    assert analyzer.analyze("doc", edited) == text_statistics(edited)
+    stats = analyzer.stats()
+    assert stats["incremental"] == 1
+    assert stats["blocks_counted"] - counted <= 6
+    assert stats["blocks_reused"] > 100
+
+
+def test_documents_are_evicted_by_size():
+    analyzer = IncrementalAnalyzer(block_size=16, min_chars=10, max_chars=100)
+    analyzer.analyze("a", "x " * 30)
+    analyzer.analyze("b", "y " * 30)
+    analyzer.analyze(None, "z " * 30)
+    analyzer.analyze("c", "tiny")
+    assert analyzer.stats()["documents"] == 1 and analyzer.stats()["characters"] == 60
+
+
+def test_analyze_route_reports_richer_stats():
+    app.config.update(TESTING=True)
+    client = app.test_client()
+    text = "Meet me at the old mill. Bring the map! " * 2000
+    html = client.post("/analyze", data={"text": text}).get_data(as_text=True)
+    assert "Top words: the (4000), at (2000), bring (2000)" in html
+    assert "Average sentence length: 4.5 words" in html
+    client.post("/analyze", data={"text": text + "One more sentence."})
+    assert client.get("/api/v1/analysis").get_json()["incremental"] >= 1
@@ -0,0 +1,256 @@
+import io
+import json
+import os
+import stat
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app import app, template_cache
+from jobs import JobQueue
+from toolkit import cipher_transform, summarize_text
+
+
+@pytest.fixture()
+def client():
+    app.config.update(TESTING=True)
+    return app.test_client()
+
+
+def test_api_batch_cipher(client):
+    response = client.post(
+        "/api/v1/cipher",
+        json={
+            "defaults": {"cipher_type": "caesar", "key": "2"},
+            "items": [{"text": "abc XYZ"}, {"text": "cde", "mode": "decode"}, {"text": "x", "key": "oops"}],
+        },
+    )
+    assert response.status_code == 200
+    assert "Set-Cookie" not in response.headers
+    data = response.get_json()
+    assert data["results"] == ["cde ZAB", "abc", None]
+    assert data["errors"] == [{"index": 2, "error": "Caesar key must be an integer."}]
+
+
+def test_api_batch_conversions(client):
+    item = {"value": 30, "from_unit": "mpg_us", "to_unit": "km_per_l"}
+    fuel = client.post("/api/v1/fuel", json=[item] * 10000)
+    assert fuel.get_json()["results"][-1] == 12.754311
+
+    item = {"value": "1", "from_prefix": "mega", "to_prefix": "giga"}
+    sci = client.post("/api/v1/scientific", json=[item, {}])
+    data = sci.get_json()
+    assert data["results"][0]["converted"] == 0.001
+    assert data["errors"] == [{"index": 1, "error": "Missing field 'value'."}]
+
+    item = {"reference_date": "2026-02-16", "target_date": "2026-03-05"}
+    dates = client.post("/api/v1/date-counter", json=[item])
+    assert dates.get_json()["results"][0]["delta_days"] == 17
+
+
+def test_api_batch_reports_non_finite_values_per_item(client):
+    items = [{"value": value, "from_prefix": "base", "to_prefix": "kilo"} for value in ("inf", "nan", "1e308", "2")]
+    items[2]["from_prefix"] = "giga"
+    response = client.post("/api/v1/scientific", json=items)
+    assert response.status_code == 200
+    data = json.loads(response.get_data(as_text=True))
+    assert data["results"][:3] == [None, None, None] and data["results"][3]["converted"] == 0.002
+    assert [error["error"] for error in data["errors"]] == ["Values must be finite numbers."] * 3
+
+    item = {"value": "nan", "from_unit": "mpg_us", "to_unit": "km_per_l"}
+    body = client.post("/api/v1/fuel", json=[item]).get_data(as_text=True)
+    assert "NaN" not in body
+    assert json.loads(body)["errors"] == [{"index": 0, "error": "Values must be finite numbers."}]
+
+    items = [
+        {"value": 10**400, "from_unit": "mpg_us", "to_unit": "km_per_l"},
+        {"value": 1e-320, "from_unit": "l_per_100km", "to_unit": "km_per_l"},
+    ]
+    body = client.post("/api/v1/fuel", json=items).get_data(as_text=True)
+    assert "Infinity" not in body
+    assert [error["error"] for error in json.loads(body)["errors"]] == [
+        "Values must be finite numbers.",
+        "The result is too large to represent.",
+    ]
+    item = {"value": 1e300, "from_prefix": "base", "to_prefix": "pico"}
+    data = client.post("/api/v1/scientific", json=[item]).get_json()
+    assert data["results"] == [None] and data["errors"][0]["error"] == "The result is too large to represent."
+
+    html = client.post("/scientific", data={"sci_value": "inf"}).get_data(as_text=True)
+    assert "Values must be finite numbers." in html
+
+
+def test_api_batch_rejects_bad_requests(client):
+    assert client.post("/api/v1/nope", json=[]).status_code == 404
+    assert client.post("/api/v1/analyze", json={"text": "hi"}).status_code == 400
+    assert client.post("/api/v1/analyze", json=[{}] * 10001).status_code == 413
+
+
+def test_fx_cache_stats_endpoint(client):
+    stats = client.get("/api/v1/fx-cache").get_json()
+    assert {"hits", "misses", "stale_serves", "evictions", "fetch_seconds_total"} <= set(stats)
+
+
+def test_session_state_is_server_side(client):
+    text = "Long pasted article. " * 500
+    response = client.post("/analyze", data={"text": text})
+    assert response.status_code == 200
+    cookie = response.headers["Set-Cookie"]
+    assert len(cookie) < 200
+
+    client.post("/cipher", data={"cipher_text": "abc", "cipher_type": "caesar", "cipher_key": "1"})
+    page = client.get("/").get_data(as_text=True)
+    assert "Long pasted article." in page and "bcd" in page
+    assert "Set-Cookie" not in client.get("/").headers
+
+    page = client.post("/clear", data={"tool": "analyze"}).get_data(as_text=True)
+    assert "Long pasted article." not in page and "bcd" in page
+    page = client.post("/clear-all").get_data(as_text=True)
+    assert "bcd" not in page
+
+
+def test_old_session_cookies_drop_the_stored_context(client):
+    with client.session_transaction() as session:
+        session["context"] = {"text": "Long pasted article. " * 100}
+    response = client.get("/")
+    assert "Long pasted article." not in response.get_data(as_text=True)
+    assert len(response.headers["Set-Cookie"]) < 200
+    with client.session_transaction() as session:
+        assert "context" not in session
+
+
+def test_fragment_responses_render_one_panel(client):
+    full = client.post("/fuel", data={"fuel_value": "30", "fuel_from_unit": "mpg_us", "fuel_to_unit": "km_per_l"})
+    fragment = client.post(
+        "/fuel",
+        data={"fuel_value": "30", "fuel_from_unit": "mpg_us", "fuel_to_unit": "km_per_l"},
+        headers={"X-Fragment": "fuel"},
+    )
+    html = fragment.get_data(as_text=True)
+    assert fragment.headers["X-Fragment"] == "fuel"
+    assert html.startswith('<article class="card" id="tool-fuel"') and "Converted Value: 12.75" in html
+    assert "<style>" not in html and "tool-cipher" not in html
+    assert len(fragment.data) * 5 < len(full.data)
+
+    cleared = client.post("/clear", data={"tool": "fuel"}, headers={"X-Fragment": "fuel"})
+    assert "Converted Value" not in cleared.get_data(as_text=True)
+    assert "X-Fragment" not in client.post("/clear", data={"tool": "fuel"}).headers
+
+
+def test_stream_upload_pipelines(client):
+    text = "Attack at dawn. Héllo wörld! " * 5000
+    upload = {"file": (io.BytesIO(text.encode("utf-8")), "plain.txt"), "cipher_type": "vigenere", "cipher_key": "lemon"}
+    response = client.post("/stream/cipher", data=upload, content_type="multipart/form-data")
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.headers["Content-Disposition"] == 'attachment; filename="vigenere-encode.txt"'
+    assert response.get_data(as_text=True) == cipher_transform("vigenere", "encode", text, "lemon")
+
+    response = client.post("/stream/cipher?cipher_type=morse", data=b"sos now")
+    assert response.get_data(as_text=True) == "... --- ... / -. --- .--"
+    assert client.post("/stream/analyze", data=text.encode("utf-8")).get_json() == summarize_text(text)
+
+    assert client.post("/stream/cipher?cipher_type=caesar&cipher_key=x", data=b"abc").status_code == 400
+    assert client.post("/stream/cipher?cipher_type=rot13", data=b"\xff\xfe").status_code == 400
+    assert client.post("/stream/analyze", data={}, content_type="multipart/form-data").status_code == 400
+
+
+def test_download_button_uses_textarea_without_a_file(client):
+    form = {"cipher_text": "Attack at dawn", "cipher_type": "rot13", "file": (io.BytesIO(b""), "")}
+    response = client.post("/stream/cipher", data=form, content_type="multipart/form-data")
+    assert response.status_code == 200 and response.get_data(as_text=True) == "Nggnpx ng qnja"
+
+    form = {"cipher_text": "", "cipher_type": "rot13", "file": (io.BytesIO(b""), "")}
+    assert client.post("/stream/cipher", data=form, content_type="multipart/form-data").status_code == 400
+    form = {"cipher_text": "Nggnpx ng qnja", "cipher_type": "rot13", "cipher_mode": "crack"}
+    response = client.post("/stream/cipher", data=form, content_type="multipart/form-data")
+    assert response.status_code == 400 and "Crack mode" in response.get_json()["error"]
+
+
+def test_job_queue_round_trip(client, monkeypatch, tmp_path):
+    queue = JobQueue(str(tmp_path), workers=1)
+    monkeypatch.setattr("app.JOB_QUEUE", queue)
+    text = "Attack at dawn. Héllo wörld! " * 2000
+    submitted = client.post("/api/v1/jobs/cipher?cipher_type=vigenere&cipher_key=lemon", data=text.encode("utf-8"))
+    assert submitted.status_code == 202
+    job = submitted.get_json()
+    assert job["bytes_total"] == len(text.encode("utf-8"))
+    assert submitted.headers["Location"] == job["status_url"]
+
+    queue.shutdown()
+    status = client.get(job["status_url"]).get_json()
+    assert status["status"] == "done" and status["progress"] == 1.0
+    result = client.get(job["result_url"])
+    assert result.get_data(as_text=True) == cipher_transform("vigenere", "encode", text, "lemon")
+
+    analyzed = client.post("/api/v1/jobs/analyze", data=text.encode("utf-8")).get_json()
+    queue.shutdown()
+    assert client.get(analyzed["result_url"]).get_json() == summarize_text(text)
+
+    failed = client.post("/api/v1/jobs/cipher?cipher_type=rot13", data=b"\xff").get_json()
+    queue.shutdown()
+    assert client.get(failed["result_url"]).status_code == 422
+    assert client.post("/api/v1/jobs/cipher?cipher_type=caesar", data=b"x").status_code == 400
+    assert client.get("/api/v1/jobs/../etc").status_code == 404
+    assert client.get("/api/v1/jobs/" + "0" * 32).status_code == 404
+
+
+def test_metrics_endpoint_reports_phases_and_functions(client):
+    client.post("/fuel", data={"fuel_value": "30", "fuel_from_unit": "mpg_us", "fuel_to_unit": "km_per_l"})
+    body = client.get("/metrics").get_data(as_text=True)
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert 'http_request_duration_seconds_count{route="/fuel",method="POST",status="200"}' in body
+    assert 'toolkit_function_duration_seconds_bucket{function="convert_fuel_consumption",le="+Inf"}' in body
+    for phase in ("session_load", "session_save", "render"):
+        assert f'app_phase_duration_seconds_count{{phase="{phase}"}}' in body
+    assert 'fx_cache_events_total{event="misses"}' in body
+
+
+def test_repeated_inputs_are_memoized(client):
+    before = client.get("/api/v1/memo").get_json()
+    for _ in range(2):
+        client.post("/cipher", data={"cipher_text": "memo me", "cipher_type": "rot13"})
+    after = client.get("/api/v1/memo").get_json()
+    assert after["hits"] == before["hits"] + 1
+    assert after["misses"] == before["misses"] + 1
+    assert 'memo_events_total{event="hits"}' in client.get("/metrics").get_data(as_text=True)
+
+
+def test_cipher_crack_fills_in_the_key(client):
+    secret = "Meet me at the old mill after dark, bring the lantern and the map of the valley. " * 3
+    encoded = cipher_transform("caesar", "encode", secret, "5")
+    html = client.post(
+        "/cipher", data={"cipher_text": encoded, "cipher_type": "caesar", "cipher_mode": "crack"}
+    ).get_data(as_text=True)
+    assert 'name="cipher_key" type="text" value="5"' in html
+    assert "Meet me at the old mill" in html
+
+
+def test_fx_is_imported_lazily_and_warm_up_loads_it(tmp_path):
+    code = (
+        "import sys; sys.path.insert(0, sys.argv[1]); import app; "
+        "assert not {'fx', 'asyncio', 'numpy'} & set(sys.modules); "
+        "app.warm_up(); assert 'fx' in sys.modules; "
+        "assert len(app.app.jinja_env.cache) == 7"
+    )
+    project = str(Path(__file__).resolve().parents[1])
+    env = {**os.environ, "JINJA_CACHE_DIR": str(tmp_path / "jinja")}
+    subprocess.run([sys.executable, "-c", code, project], check=True, env=env)
+    assert list(tmp_path.glob("jinja/*.cache"))
+    assert stat.S_IMODE((tmp_path / "jinja").stat().st_mode) == 0o700
+
+
+def test_template_cache_refuses_shared_directory(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+    with pytest.raises(ValueError, match="only this user"):
+        template_cache(str(shared))
+    (tmp_path / "link").symlink_to(tmp_path / "private", target_is_directory=True)
+    (tmp_path / "private").mkdir(mode=0o700)
+    with pytest.raises(ValueError):
+        template_cache(str(tmp_path / "link"))
@@ -0,0 +1,63 @@
+import gzip
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app import app
+from assets import AssetManifest
+
+
+@pytest.fixture()
+def client():
+    app.config.update(TESTING=True)
+    return app.test_client()
+
+
+def test_manifest_fingerprints_and_precompresses(tmp_path):
+    (tmp_path / "site.css").write_text("body { color: red; }\n" * 200)
+    (tmp_path / "notes.txt").write_text("not an asset")
+    manifest = AssetManifest(str(tmp_path))
+
+    url_name = manifest.url_name("site.css")
+    assert re.fullmatch(r"site\.[0-9a-f]{16}\.css", url_name)
+    asset = manifest.get(url_name)
+    assert gzip.decompress(asset.variants["gzip"]) == asset.variants["identity"]
+    assert asset.etag("gzip") != asset.etag("identity")
+    with pytest.raises(ValueError):
+        manifest.url_name("notes.txt")
+
+    (tmp_path / "site.css").write_text("body { color: blue; }\n" * 200)
+    assert AssetManifest(str(tmp_path)).url_name("site.css") != url_name
+
+
+def test_page_links_immutable_assets(client):
+    page = client.get("/").get_data(as_text=True)
+    assert "<style>" not in page
+    css_url = re.search(r'href="(/assets/app\.[0-9a-f]+\.css)"', page).group(1)
+
+    response = client.get(css_url, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "immutable" in response.headers["Cache-Control"]
+    assert b".shell" in gzip.decompress(response.data)
+
+    cached = client.get(css_url, headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["ETag"]})
+    assert cached.status_code == 304
+    assert client.get("/assets/app.0000000000000000.css").status_code == 404
+
+
+def test_dynamic_responses_are_compressed_above_threshold(client):
+    plain = client.get("/")
+    compressed = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in plain.headers
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.headers["Vary"]
+    assert gzip.decompress(compressed.data) == plain.data
+
+    item = {"value": 30, "from_unit": "mpg_us", "to_unit": "km_per_l"}
+    small = client.post("/api/v1/fuel", json=[item], headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import unquote
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import toolkit
+from fx import ConnectionPool, FXCache, SingleFlight, SQLiteRateStore, YahooFXProvider
+
+
+class StubYahooHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    rates = {"USDEUR=X": 0.9, "EURUSD=X": 1.1, "USDGBP=X": 0.8}
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.clients.add(self.client_address)
+        time.sleep(server.delay)
+        symbol = unquote(self.path.rsplit("/", 1)[-1])
+        if server.status != 200:
+            self.send_response(server.status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        payload = {"chart": {"result": [{"meta": {"regularMarketPrice": self.rates.get(symbol, 2.0)}}]}}
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def stub_yahoo():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubYahooHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.clients = set()
+    server.delay = 0.0
+    server.status = 200
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture()
+def provider(stub_yahoo, monkeypatch):
+    host, port = stub_yahoo.server_address
+    provider = YahooFXProvider(f"http://{host}:{port}", ConnectionPool())
+    monkeypatch.setattr(toolkit, "YAHOO_PROVIDER", provider)
+    monkeypatch.setattr(toolkit, "FX_CACHE", FXCache())
+    yield provider
+    provider.pool.close()
+
+
+def test_provider_reuses_keep_alive_connection(stub_yahoo, provider):
+    assert toolkit.fetch_yahoo_fx_rate("usd", "eur") == 0.9
+    assert toolkit.fetch_yahoo_fx_rate("EUR", "USD") == 1.1
+    assert stub_yahoo.requests == ["/v8/finance/chart/USDEUR%3DX", "/v8/finance/chart/EURUSD%3DX"]
+    assert provider.pool.connections_opened == 1
+    assert len(stub_yahoo.clients) == 1
+
+
+def test_concurrent_misses_share_one_fetch(stub_yahoo, provider):
+    stub_yahoo.delay = 0.2
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(toolkit.get_fx_rate_with_fallback("USD", "EUR")))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [rate for rate, _, _ in results] == [0.9] * 8
+    assert len(stub_yahoo.requests) == 1
+
+
+def test_cross_rates_derive_from_usd_legs(stub_yahoo, provider):
+    rate, source, _ = toolkit.get_fx_rate_with_fallback("EUR", "GBP")
+    assert rate == pytest.approx(0.8 / 0.9)
+    assert source == "Yahoo Finance (live)"
+    assert sorted(stub_yahoo.requests) == ["/v8/finance/chart/USDEUR%3DX", "/v8/finance/chart/USDGBP%3DX"]
+
+    for from_code, to_code in [("GBP", "EUR"), ("USD", "GBP"), ("EUR", "USD"), ("GBP", "GBP")]:
+        rate, source, _ = toolkit.get_fx_rate_with_fallback(from_code, to_code)
+        assert source == "Yahoo Finance (cached)"
+    assert rate == 1.0
+    assert len(stub_yahoo.requests) == 2
+    assert set(toolkit.FX_CACHE) == {"EUR", "GBP"}
+
+
+def test_async_api_coalesces_and_falls_back(stub_yahoo, provider):
+    stub_yahoo.delay = 0.2
+
+    async def lookup():
+        return await asyncio.gather(*(toolkit.get_fx_rate_with_fallback_async("USD", "JPY") for _ in range(5)))
+
+    results = asyncio.run(lookup())
+    assert {rate for rate, _, _ in results} == {2.0}
+    assert len(stub_yahoo.requests) == 1
+
+    stub_yahoo.delay = 0.0
+    stub_yahoo.status = 429
+    rate, source, updated = toolkit.get_fx_rate_with_fallback("EUR", "GBP")
+    assert source == "Snapshot fallback"
+    assert updated == toolkit.SNAPSHOT_DATE
+
+
+def test_single_flight_propagates_errors():
+    flights = SingleFlight()
+
+    def boom():
+        raise ValueError("nope")
+
+    with pytest.raises(ValueError, match="nope"):
+        flights.do("key", boom)
+    assert flights.do("key", lambda: 42) == 42
+
+
+def test_fx_cache_serves_stale_while_refreshing(stub_yahoo, provider):
+    cache = toolkit.FX_CACHE
+    cache.set("EUR", (0.5, time.time() - 700))
+
+    rate, source, _ = toolkit.get_fx_rate_with_fallback("USD", "EUR")
+    assert (rate, source) == (0.5, "Yahoo Finance (cached)")
+    cache.wait_for_refreshes(5)
+    assert cache.get("EUR")[0] == 0.9
+    assert toolkit.get_fx_rate_with_fallback("USD", "EUR")[0] == 0.9
+
+    cache.set("GBP", (0.5, time.time() - 600 - 3600))
+    assert toolkit.get_fx_rate_with_fallback("USD", "GBP")[:2] == (0.8, "Yahoo Finance (live)")
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["stale_serves"], stats["misses"], stats["refreshes"]) == (1, 1, 1, 1)
+    assert stats["fetches"] == 2 and stats["fetch_seconds_max"] >= 0
+
+
+def test_fx_cache_lru_eviction():
+    cache = FXCache(max_entries=2)
+    now = time.time()
+    cache.set("EUR", (0.9, now))
+    cache.set("GBP", (0.8, now))
+    assert cache.get_or_load("EUR", lambda: 0.0) == (0.9, now, False)
+    cache.set("JPY", (150.0, now))
+    assert list(cache) == ["EUR", "JPY"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_sqlite_store_shares_rates_across_workers(tmp_path):
+    path = str(tmp_path / "fx.sqlite3")
+    fetched_at = time.time()
+    code = (
+        "import sys; sys.path.insert(0, sys.argv[1]); from fx import SQLiteRateStore; "
+        "SQLiteRateStore(sys.argv[2]).set('EUR', (0.91, float(sys.argv[3])))"
+    )
+    project = str(Path(__file__).resolve().parents[1])
+    subprocess.run([sys.executable, "-c", code, project, path, str(fetched_at)], check=True)
+
+    worker = FXCache(store=SQLiteRateStore(path))
+    assert worker.get_or_load("EUR", lambda: pytest.fail("rate should come from the shared store")) == (
+        0.91,
+        fetched_at,
+        False,
+    )
+    assert worker.stats()["shared_hits"] == 1
+
+    other = FXCache(store=SQLiteRateStore(path))
+    rate, _, live = other.get_or_load("GBP", lambda: 0.8)
+    assert (rate, live) == (0.8, True)
+    assert worker.get_or_load("GBP", lambda: 0.0)[::2] == (0.8, False)
+
+    store = SQLiteRateStore(path)
+    store.set("GBP", (0.1, fetched_at - 60))
+    assert store.get("GBP")[0] == 0.8
@@ -0,0 +1,122 @@
+import io
+import os
+import sys
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import toolkit
+from app import app
+from fx_archive import ArchiveLoader, FXArchive, main, read_csv, write_archive
+
+CSV = """date,EUR,GBP,JPY
+2024-01-02,0.91,0.79,141.5
+2024-01-03,0.92,,142.0
+2024-01-05,0.90,0.78,
+"""
+
+
+@pytest.fixture()
+def archive_path(tmp_path, monkeypatch):
+    path = tmp_path / "fx-archive.bin"
+    write_archive(str(path), read_csv(io.StringIO(CSV)))
+    monkeypatch.setattr(toolkit, "FX_ARCHIVE", ArchiveLoader(str(path), check_seconds=0))
+    return path
+
+
+def test_lookup_uses_latest_snapshot_on_or_before(archive_path):
+    archive = FXArchive(str(archive_path))
+    assert len(archive) == 3
+    assert archive.cross_rate("USD", "EUR", date(2024, 1, 2)) == (0.91, date(2024, 1, 2))
+    # 2024-01-04 has no row; the 3rd applies, with GBP carried forward from the 2nd.
+    rate, snapshot = archive.cross_rate("GBP", "JPY", date(2024, 1, 4))
+    assert snapshot == date(2024, 1, 3) and rate == pytest.approx(142.0 / 0.79)
+    assert archive.cross_rate("EUR", "USD", date(2030, 1, 1)) == (1 / 0.90, date(2024, 1, 5))
+    with pytest.raises(ValueError, match="on or before 2023-12-31"):
+        archive.row_for(date(2023, 12, 31))
+    with pytest.raises(ValueError, match="does not include CHF"):
+        archive.cross_rate("USD", "CHF", date(2024, 1, 5))
+    archive.close()
+
+
+def test_csv_import_merges_and_validates(tmp_path, capsys):
+    path = tmp_path / "archive.bin"
+    first = tmp_path / "first.csv"
+    first.write_text(CSV)
+    second = tmp_path / "second.csv"
+    second.write_text("date,CHF,EUR\n2024-01-04,0.85,0.93\n")
+    assert main([str(first), "--archive", str(path)]) == 0
+    assert main([str(second), "--archive", str(path)]) == 0
+    snapshots = FXArchive(str(path)).snapshots()
+    assert sorted(snapshots) == [date(2024, 1, day) for day in (2, 3, 4, 5)]
+    assert snapshots[date(2024, 1, 4)] == {"CHF": 0.85, "EUR": 0.93, "GBP": 0.79, "JPY": 142.0}
+    assert "CHF" not in snapshots[date(2024, 1, 2)]
+
+    bad = tmp_path / "bad.csv"
+    bad.write_text("date,EUR\n2024-02-30,0.9\n")
+    assert main([str(bad), "--archive", str(path)]) == 1
+    assert "Line 2" in capsys.readouterr().err
+    with pytest.raises(ValueError):
+        read_csv(io.StringIO("day,EUR\n"))
+    with pytest.raises(ValueError, match="greater than 0"):
+        read_csv(io.StringIO("date,EUR\n2024-01-01,-1\n"))
+
+
+def test_damaged_archives_raise_value_error(archive_path, monkeypatch):
+    data = archive_path.read_bytes()
+    for damaged in (b"", data[:10], data[:-8], b"NOTANFX!" + data[8:]):
+        archive_path.write_bytes(damaged)
+        with pytest.raises(ValueError, match="archive"):
+            FXArchive(str(archive_path))
+    with pytest.raises(ValueError, match="unavailable"):
+        FXArchive(str(archive_path.with_name("missing.bin")))
+
+    def unreachable(currency_code, now):
+        raise ValueError("Could not reach Yahoo Finance.")
+
+    # The currency route reports ValueErrors as messages rather than a 500.
+    archive_path.write_bytes(data[:10])
+    monkeypatch.setattr(toolkit, "_usd_leg", unreachable)
+    with pytest.raises(ValueError, match="truncated"):
+        toolkit.get_fx_rate_with_fallback("USD", "EUR")
+
+
+def test_loader_reopens_replaced_file(archive_path):
+    loader = toolkit.FX_ARCHIVE
+    assert len(loader.get()) == 3
+    write_archive(str(archive_path), {date(2025, 1, 1): {"EUR": 0.5}})
+    os.utime(archive_path, ns=(0, 0))
+    assert len(loader.get()) == 1
+    archive_path.unlink()
+    assert loader.get() is None
+
+
+def test_historical_rates_and_fallback(archive_path, monkeypatch):
+    assert toolkit.get_historical_fx_rate("usd", "gbp", "2024-01-04") == (0.79, "2024-01-03")
+    with pytest.raises(ValueError, match="YYYY-MM-DD"):
+        toolkit.get_historical_fx_rate("USD", "EUR", "04/01/2024")
+
+    def unreachable(currency_code, now):
+        raise ValueError("Could not reach Yahoo Finance.")
+
+    monkeypatch.setattr(toolkit, "_usd_leg", unreachable)
+    assert toolkit.get_fx_rate_with_fallback("USD", "EUR") == (0.90, "Snapshot fallback", "2024-01-05")
+
+    client = app.test_client()
+    html = client.post(
+        "/currency",
+        data={"currency_amount": "100", "currency_from": "USD", "currency_to": "JPY", "currency_date": "2024-01-02"},
+    ).get_data(as_text=True)
+    assert "Converted Amount: 14150.0000" in html
+    assert "Historical snapshot" in html and "2024-01-02" in html
+
+
+def test_builtin_snapshot_without_archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(toolkit, "FX_ARCHIVE", ArchiveLoader(str(tmp_path / "missing.bin")))
+    rate, snapshot = toolkit.get_historical_fx_rate("USD", "EUR", "2026-03-01")
+    assert (rate, snapshot) == (0.95, toolkit.SNAPSHOT_DATE)
+    with pytest.raises(ValueError, match="No FX snapshot"):
+        toolkit.get_historical_fx_rate("USD", "EUR", "2020-01-01")
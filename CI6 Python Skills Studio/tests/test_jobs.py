@@ -0,0 +1,60 @@
+import io
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from jobs import JobQueue
+from toolkit import cipher_transform
+
+
+def test_large_output_spills_to_disk_and_expires(tmp_path):
+    queue = JobQueue(str(tmp_path), workers=1, ttl=60, spill_bytes=1000)
+    text = "... --- ... / " * 500
+    meta = queue.submit("cipher", io.BytesIO(text.encode("utf-8")), {"cipher_type": "morse", "cipher_mode": "decode"})
+    queue.shutdown()
+
+    status = queue.status(meta["id"])
+    assert status["status"] == "done" and status["spilled"] and status["result"] is None
+    assert status["bytes_processed"] == status["bytes_total"]
+    assert b"".join(queue.iter_result(status)).decode("utf-8") == cipher_transform("morse", "decode", text)
+    assert sorted(os.listdir(tmp_path)) == [f"{meta['id']}.json", f"{meta['id']}.out"]
+
+    small = queue.submit("analyze", io.BytesIO(b"One. Two!"), {})
+    queue.shutdown()
+    assert queue.status(small["id"])["result"] == {"characters": 9, "words": 2, "sentences": 2}
+
+    assert queue.cleanup(now=status["updated_at"] + 30) == 0
+    assert queue.cleanup(now=status["updated_at"] + 3600) == 2
+    assert os.listdir(tmp_path) == []
+    assert queue.status(meta["id"]) is None
+
+
+def test_abandoned_jobs_expire(tmp_path):
+    queue = JobQueue(str(tmp_path), workers=1, ttl=60, queued_ttl=600)
+    queue._write_meta({"id": "a" * 32, "status": "queued"})
+    queue._write_meta({"id": "b" * 32, "status": "running"})
+    (tmp_path / ("b" * 32 + ".in")).write_bytes(b"input")
+    updated = queue.status("a" * 32)["updated_at"]
+    assert queue.cleanup(now=updated + 30) == 0
+
+    # A running job that stopped reporting progress for the TTL lost its worker.
+    assert queue.cleanup(now=updated + 120) == 1
+    assert sorted(os.listdir(tmp_path)) == ["a" * 32 + ".json"]
+    assert queue.cleanup(now=updated + 900) == 1
+    assert os.listdir(tmp_path) == []
+
+
+def test_cipher_settings_are_checked_before_queueing(tmp_path):
+    queue = JobQueue(str(tmp_path), workers=1)
+    upload = io.BytesIO(b"Wkh txlfn eurzq ira")
+    with pytest.raises(ValueError, match="whole text at once"):
+        queue.submit("cipher", upload, {"cipher_type": "caesar", "cipher_mode": "crack"})
+    with pytest.raises(ValueError, match="alphabetic key"):
+        queue.submit("cipher", upload, {"cipher_type": "vigenere", "cipher_key": "123"})
+    with pytest.raises(ValueError, match="Unsupported cipher"):
+        queue.submit("cipher", upload, {"cipher_type": "enigma"})
+    assert os.listdir(tmp_path) == []
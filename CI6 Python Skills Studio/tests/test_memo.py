@@ -0,0 +1,43 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from memo import MemoCache, SQLiteMemoStore, memo_key, value_size
+
+
+def test_memo_key_separates_arguments():
+    assert memo_key("f", ("ab", "c")) != memo_key("f", ("a", "bc"))
+    assert memo_key("f", (1,)) != memo_key("f", (1.0,))
+    assert memo_key("f", ("x",)) != memo_key("g", ("x",))
+    assert memo_key("f", ("x", 2.5)) == memo_key("f", ("x", 2.5))
+
+
+def test_lru_is_bounded_by_bytes():
+    entry = "x" * 1000
+    cache = MemoCache(max_bytes=8 * value_size(entry))
+    calls = []
+    upper = cache.wrap(lambda text, n: calls.append(n) or entry)
+    for n in range(9):
+        upper("same", n)
+    assert len(cache) == 8 and cache.stats()["evictions"] == 1
+    upper("same", 8)
+    upper("same", 0)
+    assert calls == list(range(9)) + [0]
+
+    cache.wrap(lambda: "y" * 2000)()
+    assert cache.stats()["oversized"] == 1
+
+
+def test_results_are_copied_and_shared_through_disk(tmp_path):
+    store = SQLiteMemoStore(str(tmp_path / "memo.sqlite3"))
+    first = MemoCache(store=store)
+    summary = first.memoize("summary", ("text",), lambda: {"words": 1})
+    summary["words"] = 99
+    assert first.memoize("summary", ("text",), lambda: None) == {"words": 1}
+    assert first.memoize("pair", (1.5,), lambda: (1.5, "1.5 x 10^0")) == (1.5, "1.5 x 10^0")
+
+    second = MemoCache(store=SQLiteMemoStore(str(tmp_path / "memo.sqlite3")))
+    assert second.memoize("pair", (1.5,), lambda: None) == (1.5, "1.5 x 10^0")
+    stats = second.stats()
+    assert stats["disk_hits"] == 1 and stats["misses"] == 0 and stats["hit_ratio"] == 1.0
@@ -0,0 +1,45 @@
+import sys
+import threading
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from metrics import Histogram, timed
+
+
+def test_histogram_merges_thread_shards():
+    histogram = Histogram("demo_seconds", "Demo.", ("kind",), buckets=(0.1, 1.0))
+
+    def work():
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value, ("a",))
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    histogram.observe(0.1, ("b",))
+
+    assert histogram.collect() == {("a",): [4, 4, 4, 22.2], ("b",): [1, 0, 0, 0.1]}
+    lines = histogram.expose()
+    assert 'demo_seconds_bucket{kind="a",le="1.0"} 8' in lines
+    assert 'demo_seconds_count{kind="a"} 12' in lines
+
+
+def test_timed_records_calls_and_errors():
+    histogram = Histogram("calls_seconds", "Calls.", ("function",))
+
+    @timed(histogram=histogram)
+    def double(value):
+        if value < 0:
+            raise ValueError("negative")
+        return value * 2
+
+    assert double(2) == 4
+    try:
+        double(-1)
+    except ValueError:
+        pass
+    assert double.__name__ == "double"
+    assert sum(histogram.collect()[("double",)][:-1]) == 2
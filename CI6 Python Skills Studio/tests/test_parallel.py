@@ -0,0 +1,38 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from parallel import MORSE_SEPARATOR, TextJobExecutor, split_text
+from toolkit import cipher_transform
+
+
+@pytest.fixture()
+def executor():
+    executor = TextJobExecutor(threshold=64, chunk_size=50, workers=2)
+    yield executor
+    executor.shutdown()
+
+
+TEXT = "Attack at dawn! Héllo wörld... Straße? 42 ok. " * 40
+
+
+def test_split_text_respects_boundaries():
+    assert split_text("abcdefg", 3) == ["abc", "def", "g"]
+    assert split_text(".- -... / -.-.", 2, MORSE_SEPARATOR) == [".- ", "-... ", "/ ", "-.-."]
+    assert split_text("", 3) == []
+
+
+def test_parallel_jobs_match_inline(executor):
+    for cipher_type, key in [("vigenere", "Lemon"), ("morse", ""), ("caesar", "5")]:
+        for mode in ("encode", "decode"):
+            expected = cipher_transform(cipher_type, mode, TEXT, key)
+            assert executor.cipher_transform(cipher_type, mode, TEXT, key) == expected
+    encoded = cipher_transform("morse", "encode", TEXT)
+    assert executor.cipher_transform("morse", "decode", encoded) == cipher_transform("morse", "decode", encoded)
+    assert executor._executor is not None
+
+    with pytest.raises(ValueError):
+        executor.cipher_transform("vigenere", "encode", TEXT, "123")
@@ -0,0 +1,72 @@
+import os
+import pstats
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import profiling
+from app import app
+from toolkit import summarize_text
+
+
+@pytest.fixture()
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "s3cret")
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    app.config.update(TESTING=True)
+    return app.test_client()
+
+
+def test_requested_mode_needs_matching_token():
+    assert profiling.requested_mode({"X-Profile": "s3cret"}, {}, token="") is None
+    assert profiling.requested_mode({"X-Profile": "wrong"}, {}, token="s3cret") is None
+    assert profiling.requested_mode({}, {"profile": "s3cret"}, token="s3cret") == "cprofile"
+    assert profiling.requested_mode({"X-Profile": "s3cret", "X-Profile-Mode": "sample"}, {}, token="s3cret") == "sample"
+
+
+def test_profiled_request_writes_pstats(client, tmp_path):
+    assert "X-Profile-Artifact" not in client.post("/analyze", data={"text": "a b"}).headers
+
+    response = client.post("/cipher?profile=s3cret", data={"cipher_text": "hello", "cipher_type": "rot13"})
+    artifact = response.headers["X-Profile-Artifact"]
+    assert artifact.endswith("-cipher-%d.prof" % os.getpid())
+    functions = {name for _, _, name in pstats.Stats(str(tmp_path / artifact)).stats}
+    assert "cipher_transform" in functions
+
+
+def test_overlapping_requests_fall_back_to_sampling(client):
+    # Stands in for a cProfile request still running on another thread.
+    with profiling._CPROFILE_LOCK:
+        response = client.post("/analyze?profile=s3cret", data={"text": "a b"})
+    assert response.status_code == 200
+    assert response.headers["X-Profile-Artifact"].endswith(".folded")
+
+    def profiled(_):
+        response = app.test_client().post("/cipher?profile=s3cret", data={"cipher_text": "hi", "cipher_type": "rot13"})
+        return response.status_code, response.headers["X-Profile-Artifact"].rsplit(".", 1)[1]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(profiled, range(32)))
+    assert all(status == 200 for status, _ in results)
+    assert {suffix for _, suffix in results} <= {"prof", "folded"}
+    assert not profiling._CPROFILE_LOCK.locked()
+
+
+def test_stack_sampler_collapses_stacks(tmp_path):
+    sampler = profiling.StackSampler(threading.get_ident(), interval=0.001)
+    sampler.start()
+    deadline = time.perf_counter() + 0.1
+    while time.perf_counter() < deadline:
+        summarize_text("word " * 2000)
+    sampler.stop()
+    sampler.write(str(tmp_path / "out.folded"))
+
+    lines = (tmp_path / "out.folded").read_text().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("test_profiling.py:test_stack_sampler_collapses_stacks" in line for line in lines)
@@ -0,0 +1,49 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from session_store import MemorySessionStore, SQLiteSessionStore, state_size
+
+
+def test_memory_session_store_is_lru_bounded():
+    store = MemorySessionStore(max_entries=2)
+    store.save("a", "fuel", {"fuel_value": "1"})
+    store.save("b", "fuel", {"fuel_value": "2"})
+    assert store.load("a") == {"fuel": {"fuel_value": "1"}}
+    store.save("c", "fuel", {"fuel_value": "3"})
+    assert store.load("b") == {}
+    assert len(store) == 2
+
+
+def test_memory_session_store_is_bounded_by_size():
+    store = MemorySessionStore(max_entries=100, max_bytes=24_000)
+    for sid in "abcdefghij":
+        store.save(sid, "analyze", {"text": sid * 2500})
+    assert store.load("a") == {} and store.load("j") == {"analyze": {"text": "j" * 2500}}
+    assert 0 < store.bytes <= 24_000
+
+    store.save("j", "cipher", {"cipher_text": "x" * 5000})
+    assert store.load("j") == {"analyze": {"text": "j" * 2500}}
+    store.save("j", "analyze", {})
+    assert store.load("j") == {}
+    assert store.bytes == (len(store) - 1) * state_size({"text": "j" * 2500})
+
+
+def test_sqlite_session_store_writes_per_tool(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+    summary = {"characters": 2, "words": 1, "sentences": 1}
+    store.save("sid", "fuel", {"fuel_value": "30", "fuel_output": 12.754311})
+    store.save("sid", "analyze", {"text": "hi", "summary": summary})
+    store.save("sid", "fuel", {})
+    assert store.load("sid") == {"analyze": {"text": "hi", "summary": summary}}
+    assert SQLiteSessionStore(store.path).load("sid") == store.load("sid")
+    assert store.load("other") == {}
+
+
+def test_sqlite_session_store_errors_fall_back_to_defaults(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+    store.save("sid", "fuel", {"fuel_value": "30"})
+    store._connections.get().execute("DROP TABLE session_state")
+    store.save("sid", "fuel", {"fuel_value": "40"})
+    assert store.load("sid") == {}
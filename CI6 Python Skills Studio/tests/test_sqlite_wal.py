@@ -0,0 +1,24 @@
+import sys
+import threading
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from sqlite_wal import ThreadConnections
+
+
+def test_connections_are_per_thread_and_per_process(tmp_path):
+    connections = ThreadConnections(str(tmp_path / "store.sqlite3"), "CREATE TABLE IF NOT EXISTS t (k TEXT)")
+    connection = connections.get()
+    assert connections.get() is connection
+    assert connection.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+
+    others = []
+    thread = threading.Thread(target=lambda: others.append(connections.get()))
+    thread.start()
+    thread.join()
+    assert others[0] is not connection
+
+    # As seen from a forked child, the parent's connection is never reused.
+    connections._local.pid = -1
+    assert connections.get() is not connection
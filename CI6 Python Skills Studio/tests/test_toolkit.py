@@ -1,17 +1,33 @@
+import io
 import sys
+from array import array
 from pathlib import Path
 
 import pytest
 
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
+import toolkit
 from toolkit import (
+    atbash_cipher,
+    caesar_cipher,
     cipher_transform,
     convert_fuel_consumption,
+    convert_fuel_consumption_bulk,
     convert_scientific_prefix,
+    convert_scientific_prefix_bulk,
     count_date_distance,
+    count_date_distance_bulk,
+    crack_cipher,
     get_fx_rate_with_fallback,
+    morse_decode,
+    morse_decode_stream,
+    morse_encode,
+    morse_encode_stream,
+    summarize_stream,
     summarize_text,
+    text_statistics,
+    vigenere_cipher,
 )
 
 
@@ -22,6 +38,14 @@ def test_summarize_text():
     assert result["sentences"] == 2
 
 
+def test_text_statistics():
+    result = text_statistics("Don't stop. Don't STOP now! Café, cafe and café?")
+    assert result["words"] == 9 and result["sentences"] == 3
+    assert result["average_sentence_words"] == 3.0
+    assert result["top_words"][:4] == [("café", 2), ("don't", 2), ("stop", 2), ("and", 1)]
+    assert text_statistics("")["average_sentence_words"] == 0.0
+
+
 def test_cipher_transform():
     assert cipher_transform("caesar", "encode", "abc XYZ", "2") == "cde ZAB"
     assert cipher_transform("caesar", "decode", "cde ZAB", "2") == "abc XYZ"
@@ -54,3 +78,165 @@ def test_fx_rate_fallback_snapshot():
     assert rate > 0
     assert source in {"Yahoo Finance (live)", "Yahoo Finance (cached)", "Snapshot fallback"}
     assert isinstance(updated, str) and len(updated) >= 10
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Hello world. This is CS50!",
+        "  leading space?and!! trailing...   ",
+        "no terminator at all",
+        "a.b?c!d\n\n e . f",
+        "",
+        "   \t\n  ",
+    ],
+)
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1024])
+def test_summarize_stream_matches_summarize_text(text, chunk_size):
+    assert summarize_stream(text, chunk_size=chunk_size) == summarize_text(text)
+
+
+def test_summarize_stream_file_like_and_bytes():
+    text = "Grüße aus Köln. Zweiter Satz! Dritter?"
+    assert summarize_stream(io.StringIO(text), chunk_size=4) == summarize_text(text)
+    assert summarize_stream(io.BytesIO(text.encode("utf-8")), chunk_size=3) == summarize_text(text)
+    assert summarize_stream(iter(["Hel", "lo wor", "ld.", " Bye"])) == summarize_text("Hello world. Bye")
+
+
+def test_translation_table_ciphers():
+    text = "Hello, World! ÄÖÜ ß 123 ẞ zZ aA"
+    assert caesar_cipher(text, 3) == "Khoor, Zruog! ÄÖÜ ß 123 ẞ cC dD"
+    assert caesar_cipher(text, 29) == caesar_cipher(text, 3)
+    assert caesar_cipher(caesar_cipher(text, -55), 55) == text
+    assert atbash_cipher("Hello, World! zZ") == "Svool, Dliow! aA"
+    assert cipher_transform("atbash", "decode", atbash_cipher(text)) == text
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_vigenere_cipher_backends(monkeypatch, use_numpy):
+    if use_numpy and toolkit.np is None:
+        pytest.skip("NumPy is not installed")
+    if not use_numpy:
+        monkeypatch.setattr(toolkit, "np", None)
+
+    assert vigenere_cipher("ATTACK AT DAWN", "LEMON") == "LXFOPV EF RNHR"
+    assert vigenere_cipher("LXFOPV EF RNHR", "lemon", decode=True) == "ATTACK AT DAWN"
+    assert vigenere_cipher("100% sure, Éa!", "Key 2") == "100% cypo, Ky!"
+
+    text = "Attack at dawn, 50% faster: ß and 中 count as letters too."
+    whole = vigenere_cipher(text, "lemon")
+    assert vigenere_cipher(text[16:], "lemon", offset=12) == whole[16:]
+    monkeypatch.setattr(toolkit, "VIGENERE_BLOCK_SIZE", 5)
+    assert cipher_transform("vigenere", "encode", text, "lemon") == whole
+
+
+def test_morse_streaming_codec():
+    text = "SOS  help, 42 ok"
+    encoded = morse_encode(text)
+    assert encoded == "... --- ... /  / .... . .-.. .--. , / ....- ..--- / --- -.-"
+    assert "".join(morse_encode_stream(["SO", "S ", " he", "lp, 4", "2 ok"])) == encoded
+    assert "".join(morse_encode_stream(io.StringIO(text))) == encoded
+
+    pieces = ["... --", "- ..", ". /", "  / .... . .-.. .--. , ", "/ ....- ..--- /", " --- -.-"]
+    assert morse_decode(encoded) == "SOS  HELP, 42 OK"
+    assert "".join(morse_decode_stream(pieces)) == morse_decode(encoded)
+    assert morse_decode("... ---/..-.-.- ...") == "SO ..-.-.-S"
+
+    # Characters without a code pass through without growing the shared table.
+    size = len(toolkit.MORSE_ENCODE_TABLE)
+    assert morse_encode("é中") == "É 中"
+    assert len(toolkit.MORSE_ENCODE_TABLE) == size
+
+
+@pytest.mark.filterwarnings("error")
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_bulk_unit_conversions_match_scalar(monkeypatch, use_numpy):
+    if use_numpy and toolkit.np is None:
+        pytest.skip("NumPy is not installed")
+    if not use_numpy:
+        monkeypatch.setattr(toolkit, "np", None)
+
+    values = array("d", [30, 2.675, 0.5, 12.754311, 1234.5678905, 1e17, 1e308, 1e-300])
+    for from_unit in toolkit.FUEL_UNITS:
+        for to_unit in toolkit.FUEL_UNITS:
+            expected = [convert_fuel_consumption(v, from_unit, to_unit) for v in values]
+            assert list(convert_fuel_consumption_bulk(values, from_unit, to_unit)) == expected
+    with pytest.raises(ValueError):
+        convert_fuel_consumption_bulk([1, 0], "mpg_us", "km_per_l")
+    with pytest.raises(ValueError, match="too small"):
+        convert_fuel_consumption_bulk([5e-324], "mpg_us", "km_per_l")
+
+    values = [1, -0.0, 999.9999999999999, 9.9999996, 123456789, 1e-280, -42.5, 1e300, 5e-321]
+    converted, coefficients, exponents = convert_scientific_prefix_bulk(values, "milli", "pico")
+    for value, result, coeff, exponent in zip(values, converted, coefficients, exponents):
+        scalar_converted, scalar_sci = convert_scientific_prefix(value, "milli", "pico")
+        assert result == scalar_converted
+        if coeff:
+            assert f"{coeff:.6g} x 10^{exponent}" == scalar_sci
+        else:
+            assert scalar_sci == "0 x 10^0"
+    for value in (float("inf"), float("nan"), 1e308):
+        with pytest.raises(ValueError, match="finite"):
+            convert_scientific_prefix_bulk([1, value], "giga", "base")
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_bulk_date_distance_matches_scalar(monkeypatch, use_numpy):
+    if use_numpy and toolkit.np is None:
+        pytest.skip("NumPy is not installed")
+    if not use_numpy:
+        monkeypatch.setattr(toolkit, "np", None)
+
+    pairs = [
+        ("2024-01-31", "2024-03-01"),
+        ("2024-02-29", "2025-02-28"),
+        ("2026-05-10", "2026-05-10"),
+        ("2030-12-31", "1999-01-01"),
+        ("2026-2-5", "2026-03-05"),
+    ]
+    batch = count_date_distance_bulk([ref for ref, _ in pairs], [target for _, target in pairs])
+    assert list(batch.rows()) == [count_date_distance(ref, target) for ref, target in pairs]
+    assert batch.target_weekday(0) == "Friday"
+    assert batch.human_span(1) == count_date_distance(*pairs[1])["human_span"]
+
+    batch = count_date_distance_bulk(["2026-01-01", "2026-02-30"], ["2026-01-08", "2026-03-01"])
+    assert batch.row(0) == count_date_distance("2026-01-01", "2026-01-08")
+    assert list(batch.errors) == [1]
+    with pytest.raises(ValueError):
+        batch.row(1)
+    with pytest.raises(ValueError):
+        count_date_distance_bulk(["2026-01-01"], [])
+
+
+ENGLISH_SAMPLE = (
+    "It was the best of times, it was the worst of times, it was the age of wisdom, it was the age of "
+    "foolishness, it was the epoch of belief, it was the epoch of incredulity, it was the season of Light, "
+    "it was the season of Darkness, it was the spring of hope, it was the winter of despair, we had "
+    "everything before us, we had nothing before us, we were all going direct to Heaven, we were all going "
+    "direct the other way. In short, the period was so far like the present period, that some of its "
+    "noisiest authorities insisted on its being received, for good or for evil, in the superlative degree "
+    "of comparison only."
+)
+
+
+def test_crack_mode_recovers_keys():
+    for key in ("3", "13", "22"):
+        encoded = cipher_transform("caesar", "encode", ENGLISH_SAMPLE, key)
+        assert cipher_transform("caesar", "crack", encoded) == ENGLISH_SAMPLE
+    assert crack_cipher("rot13", caesar_cipher(ENGLISH_SAMPLE, 9))["key"] == "9"
+    assert crack_cipher("caesar", caesar_cipher(ENGLISH_SAMPLE, 13))["cipher_type"] == "rot13"
+    assert crack_cipher("caesar", atbash_cipher(ENGLISH_SAMPLE)) == {
+        "cipher_type": "atbash",
+        "key": "",
+        "plaintext": ENGLISH_SAMPLE,
+    }
+
+    for key in ("lemon", "dickens", "ab"):
+        cracked = crack_cipher("vigenere", vigenere_cipher(ENGLISH_SAMPLE, key))
+        assert cracked["key"] == key
+        assert cracked["plaintext"] == ENGLISH_SAMPLE
+
+    with pytest.raises(ValueError):
+        crack_cipher("caesar", "1234 !!")
+    with pytest.raises(ValueError):
+        cipher_transform("morse", "crack", ENGLISH_SAMPLE)
@@ -1,11 +1,48 @@
-import json
+import codecs
+import heapq
+import math
+import re
+import threading
+from array import array
+from calendar import monthrange
+from collections import Counter
 from datetime import date, datetime
+from functools import lru_cache
 from time import time
-from urllib.error import URLError
-from urllib.parse import quote
-from urllib.request import Request, urlopen
+from typing import IO, TYPE_CHECKING, Any, Iterable, Iterator, Union
 
+from fx_archive import FX_ARCHIVE
+from metrics import FX_FALLBACKS, register_collector, timed
 
+# NumPy is optional; pure-Python fallbacks are used without it. Importing it
+# takes longer than the rest of the app's startup, so it is loaded by the first
+# Vigenere or bulk call (warm_up() makes one before gunicorn forks). Module
+# attribute access (toolkit.np) goes through __getattr__; np is None without it.
+np: Any
+
+
+def _load_numpy() -> None:
+    if "np" in globals():
+        return
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    globals().setdefault("np", numpy)
+
+
+def numpy_module() -> Any:
+    try:
+        return np
+    except NameError:
+        _load_numpy()
+        return np
+
+if TYPE_CHECKING:
+    from fx import FXCache, YahooFXProvider
+
+
+@timed
 def summarize_text(text: str) -> dict:
     words = [w for w in text.split() if w.strip()]
     sentences = [s for s in text.replace("?", ".").replace("!", ".").split(".") if s.strip()]
@@ -16,51 +53,257 @@ def summarize_text(text: str) -> dict:
     }
 
 
-def caesar_cipher(text: str, shift: int) -> str:
-    def rotate(char: str, base: str) -> str:
-        start = ord(base)
-        return chr(start + ((ord(char) - start + shift) % 26))
-
-    output = []
-    for ch in text:
-        if "a" <= ch <= "z":
-            output.append(rotate(ch, "a"))
-        elif "A" <= ch <= "Z":
-            output.append(rotate(ch, "A"))
+STREAM_CHUNK_SIZE = 64 * 1024
+SENTENCE_TERMINATORS = str.maketrans({"?": ".", "!": "."})
+
+TextSource = Union[str, bytes, IO, Iterable[Union[str, bytes]]]
+
+
+def _read_pieces(stream: IO, chunk_size: int) -> Iterator[Union[str, bytes]]:
+    while True:
+        piece = stream.read(chunk_size)
+        if not piece:
+            return
+        yield piece
+
+
+def iter_text_chunks(source: TextSource, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[str]:
+    if chunk_size <= 0:
+        raise ValueError("Chunk size must be at least 1.")
+
+    if isinstance(source, (str, bytes)):
+        pieces = (source[i : i + chunk_size] for i in range(0, len(source), chunk_size))
+    elif hasattr(source, "read"):
+        pieces = _read_pieces(source, chunk_size)
+    else:
+        pieces = iter(source)
+
+    decoder = None
+    for piece in pieces:
+        if isinstance(piece, bytes):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder("utf-8")()
+            piece = decoder.decode(piece)
+        if piece:
+            yield piece
+    if decoder is not None:
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+
+class TextSummarizer:
+    # Incremental equivalent of summarize_text: only the state at the last chunk
+    # boundary is kept, so words and sentences may straddle chunks. The state at
+    # the first boundary is kept too, so summarizers fed consecutive pieces of a
+    # text independently can be merged in order.
+    def __init__(self) -> None:
+        self.characters = 0
+        self.words = 0
+        self.sentences = 0
+        self.in_word = False
+        self.open_sentence = False
+        self.starts_in_word = False
+        self.terminated = False
+        self.leading_open = False
+
+    def feed(self, chunk: str) -> None:
+        if not chunk:
+            return
+        if not self.characters:
+            self.starts_in_word = not chunk[0].isspace()
+        self.characters += len(chunk)
+
+        words = len(chunk.split())
+        if self.in_word and not chunk[0].isspace():
+            words -= 1
+        self.words += words
+        self.in_word = not chunk[-1].isspace()
+
+        segments = chunk.translate(SENTENCE_TERMINATORS).split(".")
+        self.open_sentence = self.open_sentence or bool(segments[0].strip())
+        if len(segments) > 1 and not self.terminated:
+            self.terminated = True
+            self.leading_open = self.open_sentence
+        for segment in segments[1:]:
+            if self.open_sentence:
+                self.sentences += 1
+            self.open_sentence = bool(segment.strip())
+
+    def merge(self, other: "TextSummarizer") -> None:
+        # Append the counts of a summarizer that was fed the text following ours.
+        if not other.characters:
+            return
+        if not self.characters:
+            self.starts_in_word = other.starts_in_word
+        self.characters += other.characters
+        self.words += other.words - (1 if self.in_word and other.starts_in_word else 0)
+        self.in_word = other.in_word
+
+        if other.terminated:
+            self.sentences += other.sentences + (1 if self.open_sentence and not other.leading_open else 0)
+            if not self.terminated:
+                self.terminated = True
+                self.leading_open = self.open_sentence or other.leading_open
+            self.open_sentence = other.open_sentence
         else:
-            output.append(ch)
-    return "".join(output)
+            self.open_sentence = self.open_sentence or other.open_sentence
+
+    def result(self) -> dict:
+        return {
+            "characters": self.characters,
+            "words": self.words,
+            "sentences": self.sentences + (1 if self.open_sentence else 0),
+        }
+
+
+@timed
+def summarize_stream(source: TextSource, chunk_size: int = STREAM_CHUNK_SIZE) -> dict:
+    summarizer = TextSummarizer()
+    for chunk in iter_text_chunks(source, chunk_size):
+        summarizer.feed(chunk)
+    return summarizer.result()
 
 
+WORD = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+TOP_WORDS = 10
+
+
+def word_counts(text: str) -> Counter:
+    return Counter(WORD.findall(text.lower()))
+
+
+def top_words(counts: dict, limit: int = TOP_WORDS) -> list[tuple[str, int]]:
+    # Ties go alphabetically, so the order never depends on how counts were built up.
+    return heapq.nsmallest(limit, counts.items(), key=lambda item: (-item[1], item[0]))
+
+
+def detailed_summary(summary: dict, counts: dict) -> dict:
+    sentences = summary["sentences"]
+    return {
+        **summary,
+        "average_sentence_words": round(summary["words"] / sentences, 1) if sentences else 0.0,
+        "top_words": top_words(counts),
+    }
+
+
+@timed
+def text_statistics(text: str) -> dict:
+    return detailed_summary(summarize_text(text), word_counts(text))
+
+
+LOWERCASE = "abcdefghijklmnopqrstuvwxyz"
+UPPERCASE = LOWERCASE.upper()
+
+
+def _rotated_alphabet(shift: int) -> str:
+    return LOWERCASE[shift:] + LOWERCASE[:shift] + UPPERCASE[shift:] + UPPERCASE[:shift]
+
+
+CAESAR_TABLES = tuple(str.maketrans(LOWERCASE + UPPERCASE, _rotated_alphabet(s)) for s in range(26))
+CAESAR_BYTE_TABLES = tuple(
+    bytes.maketrans((LOWERCASE + UPPERCASE).encode("ascii"), _rotated_alphabet(s).encode("ascii"))
+    for s in range(26)
+)
+ATBASH_TABLE = str.maketrans(LOWERCASE + UPPERCASE, LOWERCASE[::-1] + UPPERCASE[::-1])
+
+
+@timed
+def caesar_cipher(text: str, shift: int) -> str:
+    return text.translate(CAESAR_TABLES[shift % 26])
+
+
+@timed
 def atbash_cipher(text: str) -> str:
-    output = []
-    for ch in text:
-        if "a" <= ch <= "z":
-            output.append(chr(ord("z") - (ord(ch) - ord("a"))))
-        elif "A" <= ch <= "Z":
-            output.append(chr(ord("Z") - (ord(ch) - ord("A"))))
-        else:
-            output.append(ch)
-    return "".join(output)
+    return text.translate(ATBASH_TABLE)
+
 
+VIGENERE_BLOCK_SIZE = 1 << 20
+ASCII_LETTER_BYTES = (LOWERCASE + UPPERCASE).encode("ascii")
+NON_LETTER_BYTES = bytes(b for b in range(256) if b not in ASCII_LETTER_BYTES)
+# 0xFF never occurs in UTF-8, so it can mark letter slots in an encoded template.
+LETTER_SLOT_TABLE = bytes.maketrans(ASCII_LETTER_BYTES, b"\xff" * len(ASCII_LETTER_BYTES))
 
-def vigenere_cipher(text: str, key: str, decode: bool = False) -> str:
+
+def vigenere_key_shifts(key: str, decode: bool = False) -> list[int]:
     letters = [c.lower() for c in key if c.isalpha()]
     if not letters:
         raise ValueError("Vigenere requires an alphabetic key.")
+    return [(-k if decode else k) % 26 for k in (ord(c) - ord("a") for c in letters)]
 
-    output = []
-    key_index = 0
-    for ch in text:
-        if ch.isalpha():
-            k = ord(letters[key_index % len(letters)]) - ord("a")
-            shift = -k if decode else k
-            base = "A" if ch.isupper() else "a"
-            output.append(chr(ord(base) + ((ord(ch) - ord(base) + shift) % 26)))
-            key_index += 1
-        else:
-            output.append(ch)
-    return "".join(output)
+
+def _letter_base(ch: str) -> int:
+    return ord("A") if ch.isupper() else ord("a")
+
+
+def _ascii_equivalents(letters: list[str]) -> dict[int, int]:
+    # Non-ASCII letters always land on an ASCII letter, whatever the shift.
+    return {ord(c): _letter_base(c) + (ord(c) - _letter_base(c)) % 26 for c in letters}
+
+
+def _vigenere_block_numpy(text: str, shifts: list[int], offset: int, extra: list[str]) -> tuple[str, int]:
+    if extra:
+        text = text.translate(_ascii_equivalents(extra))
+    data = text.encode("utf-8")
+    codes = np.frombuffer(data, dtype=np.uint8).copy()
+
+    folded = (codes | 32) - np.uint8(ord("a"))
+    positions = np.flatnonzero(folded < 26)
+    count = len(positions)
+    if not count:
+        return text, 0
+
+    key = np.roll(np.array(shifts, dtype=np.uint8), -offset)
+    rotated = folded[positions] + np.tile(key, count // len(key) + 1)[:count]
+    rotated -= np.uint8(26) * (rotated >= 26)
+    codes[positions] = rotated + (codes[positions] & 32) + np.uint8(ord("A"))
+    return codes.tobytes().decode("utf-8"), count
+
+
+def _vigenere_block_bytes(text: str, shifts: list[int], offset: int, extra: list[str]) -> tuple[str, int]:
+    if extra:
+        text = text.translate(_ascii_equivalents(extra))
+    data = text.encode("utf-8")
+    letters = data.translate(None, NON_LETTER_BYTES)
+    if not letters:
+        return text, 0
+
+    period = len(shifts)
+    shifted = bytearray(letters)
+    for column in range(min(period, len(letters))):
+        shift = shifts[(column + offset) % period]
+        shifted[column::period] = letters[column::period].translate(CAESAR_BYTE_TABLES[shift])
+
+    template = data.replace(b"%", b"%%").translate(LETTER_SLOT_TABLE).replace(b"\xff", b"%c")
+    return (template % tuple(shifted)).decode("utf-8"), len(letters)
+
+
+def vigenere_letter_count(text: str) -> int:
+    # Number of key positions vigenere_cipher consumes for this text.
+    if not text.isascii():
+        text = text.translate(_ascii_equivalents([c for c in set(text) if c.isalpha() and not c.isascii()]))
+    return len(text.encode("utf-8").translate(None, NON_LETTER_BYTES))
+
+
+def vigenere_stream(source: TextSource, key: str, decode: bool = False, offset: int = 0) -> Iterator[str]:
+    # The key position after each block is carried into the next one, so any
+    # chunking of the input produces the same output.
+    shifts = vigenere_key_shifts(key, decode)
+    transform = _vigenere_block_numpy if numpy_module() is not None else _vigenere_block_bytes
+    return _vigenere_blocks(iter_text_chunks(source, VIGENERE_BLOCK_SIZE), shifts, offset, transform)
+
+
+def _vigenere_blocks(blocks: Iterator[str], shifts: list[int], offset: int, transform) -> Iterator[str]:
+    for block in blocks:
+        extra = [] if block.isascii() else [c for c in set(block) if c.isalpha() and not c.isascii()]
+        encoded, count = transform(block, shifts, offset, extra)
+        offset = (offset + count) % len(shifts)
+        yield encoded
+
+
+@timed
+def vigenere_cipher(text: str, key: str, decode: bool = False, offset: int = 0) -> str:
+    return "".join(vigenere_stream(text, key, decode, offset))
 
 
 MORSE_MAP = {
@@ -104,30 +347,176 @@ MORSE_MAP = {
 MORSE_REVERSE_MAP = {v: k for k, v in MORSE_MAP.items()}
 
 
+class _MorseEncodeTable(dict):
+    # Every character maps to its code plus a separator; characters without
+    # a code pass through. Only ASCII is stored (see MORSE_ENCODE_TABLE), so
+    # arbitrary input cannot grow the table.
+    def __missing__(self, char: str) -> str:
+        return char + " "
+
+
+class _MorseDecodeTable(dict):
+    def __missing__(self, token: str) -> str:
+        return token
+
+
+MORSE_WORD_MARK = "\x00"
+MORSE_ENCODE_TABLE = _MorseEncodeTable(
+    {chr(code): chr(code) + " " for code in range(128)},
+    **{k: v + " " for k, v in MORSE_MAP.items()},
+    **{" ": MORSE_WORD_MARK},
+)
+MORSE_DECODE_TABLE = _MorseDecodeTable(MORSE_REVERSE_MAP, **{"/": " "})
+
+
+def _morse_encode_chunk(chunk: str) -> str:
+    lookup = MORSE_ENCODE_TABLE.__getitem__
+    if MORSE_WORD_MARK in chunk:
+        return " / ".join("".join(map(lookup, word))[:-1] for word in chunk.split(" "))
+    encoded = "".join(map(lookup, chunk))
+    if not chunk.endswith(" "):
+        encoded = encoded[:-1]
+    return encoded.replace(" " + MORSE_WORD_MARK, MORSE_WORD_MARK).replace(MORSE_WORD_MARK, " / ")
+
+
+def morse_encode_stream(source: TextSource) -> Iterator[str]:
+    in_word = False
+    for chunk in iter_text_chunks(source):
+        chunk = chunk.upper()
+        encoded = _morse_encode_chunk(chunk)
+        if in_word and not chunk.startswith(" "):
+            encoded = " " + encoded
+        in_word = not chunk.endswith(" ")
+        yield encoded
+
+
+def _morse_decode_tokens(text: str) -> str:
+    return "".join(map(MORSE_DECODE_TABLE.__getitem__, text.replace("/", " / ").split()))
+
+
+def morse_decode_stream(source: TextSource) -> Iterator[str]:
+    # Only the unfinished token at the end of a chunk is carried forward;
+    # everything before the last space or "/" can be decoded right away.
+    pending: list[str] = []
+    for chunk in iter_text_chunks(source):
+        cut = len(chunk)
+        while cut and not (chunk[cut - 1] == "/" or chunk[cut - 1].isspace()):
+            cut -= 1
+        if not cut:
+            pending.append(chunk)
+            continue
+        decoded = _morse_decode_tokens("".join(pending) + chunk[:cut])
+        pending = [chunk[cut:]]
+        if decoded:
+            yield decoded
+    decoded = _morse_decode_tokens("".join(pending))
+    if decoded:
+        yield decoded
+
+
+@timed
 def morse_encode(text: str) -> str:
-    words = []
-    for word in text.upper().split(" "):
-        chars = []
-        for ch in word:
-            if ch in MORSE_MAP:
-                chars.append(MORSE_MAP[ch])
-            else:
-                chars.append(ch)
-        words.append(" ".join(chars))
-    return " / ".join(words)
+    return "".join(morse_encode_stream(text))
 
 
+@timed
 def morse_decode(text: str) -> str:
-    words = []
-    for word in text.split("/"):
-        chars = []
-        for token in word.strip().split():
-            chars.append(MORSE_REVERSE_MAP.get(token, token))
-        words.append("".join(chars))
-    return " ".join(words)
+    return "".join(morse_decode_stream(text))
 
 
-def cipher_transform(cipher_type: str, mode: str, text: str, key: str = "") -> str:
+# Relative letter frequencies of English text, a to z.
+ENGLISH_FREQUENCIES = (
+    0.08167, 0.01492, 0.02782, 0.04253, 0.12702, 0.02228, 0.02015, 0.06094, 0.06966,
+    0.00153, 0.00772, 0.04025, 0.02406, 0.06749, 0.07507, 0.01929, 0.00095, 0.05987,
+    0.06327, 0.09056, 0.02758, 0.00978, 0.02360, 0.00150, 0.01974, 0.00074,
+)
+LOWERCASE_CODES = LOWERCASE.encode("ascii")
+CRACK_MAX_KEY_LENGTH = 20
+CRACK_KEY_LENGTH_SAMPLE = 1 << 16
+
+
+def _letter_histogram(letters: bytes) -> list[int]:
+    return [letters.count(code) for code in LOWERCASE_CODES]
+
+
+def _chi_squared(observed: Iterable[int], total: int) -> float:
+    return sum((count - total * f) ** 2 / (total * f) for count, f in zip(observed, ENGLISH_FREQUENCIES))
+
+
+def _best_shift(histogram: list[int]) -> tuple[int, float]:
+    # Ciphertext letter (i + shift) % 26 stands for plaintext letter i, so each
+    # shift is scored by rotating the histogram instead of decoding the text.
+    total = sum(histogram)
+    scores = [(_chi_squared(histogram[shift:] + histogram[:shift], total), shift) for shift in range(26)]
+    score, shift = min(scores)
+    return shift, score
+
+
+def _index_of_coincidence(histogram: list[int]) -> float:
+    total = sum(histogram)
+    if total < 2:
+        return 0.0
+    return sum(count * (count - 1) for count in histogram) / (total * (total - 1))
+
+
+def _crack_letters(text: str, fold_non_ascii: bool = False) -> bytes:
+    # Lowercase ASCII letters of the text. With fold_non_ascii, other letters are
+    # kept too, in the order vigenere_cipher consumes key positions.
+    if fold_non_ascii and not text.isascii():
+        text = text.translate(_ascii_equivalents([c for c in set(text) if c.isalpha() and not c.isascii()]))
+    return text.encode("utf-8").translate(None, NON_LETTER_BYTES).lower()
+
+
+def _vigenere_key_length(letters: bytes) -> int:
+    # Columns of the right period are plain Caesar texts, so their index of
+    # coincidence is close to English (~0.066) instead of random (~0.038).
+    # Multiples of the period score as well, so the shortest strong one wins.
+    sample = letters[:CRACK_KEY_LENGTH_SAMPLE]
+    longest = max(1, min(CRACK_MAX_KEY_LENGTH, len(sample) // 4))
+    scores = {}
+    for period in range(1, longest + 1):
+        columns = [_letter_histogram(sample[column::period]) for column in range(period)]
+        scores[period] = sum(map(_index_of_coincidence, columns)) / period
+    best = max(scores.values())
+    return min(period for period, score in scores.items() if score >= best * 0.9)
+
+
+@timed
+def crack_cipher(cipher_type: str, text: str) -> dict:
+    letters = _crack_letters(text, fold_non_ascii=(cipher_type == "vigenere"))
+    if not letters:
+        raise ValueError("Crack mode needs some letters to analyze.")
+
+    if cipher_type == "vigenere":
+        period = _vigenere_key_length(letters)
+        key = "".join(
+            LOWERCASE[_best_shift(_letter_histogram(letters[column::period]))[0]] for column in range(period)
+        )
+        # A multiple of the true period yields the key repeated; keep one copy.
+        key = next(key[:size] for size in range(1, period + 1) if key == key[:size] * (period // size))
+        return {"cipher_type": "vigenere", "key": key, "plaintext": vigenere_cipher(text, key, decode=True)}
+
+    if cipher_type in ("caesar", "rot13", "atbash"):
+        histogram = _letter_histogram(letters)
+        shift, shift_score = _best_shift(histogram)
+        atbash_score = _chi_squared(histogram[::-1], sum(histogram))
+        if atbash_score < shift_score:
+            return {"cipher_type": "atbash", "key": "", "plaintext": atbash_cipher(text)}
+        if shift == 13:
+            return {"cipher_type": "rot13", "key": "", "plaintext": caesar_cipher(text, 13)}
+        return {"cipher_type": "caesar", "key": str(shift), "plaintext": caesar_cipher(text, -shift)}
+
+    raise ValueError("Crack mode supports Caesar, ROT13, Atbash and Vigenere.")
+
+
+def cipher_stream(cipher_type: str, mode: str, source: TextSource, key: str = "") -> Iterator[str]:
+    # Arguments are validated here, before any input is read, so callers can
+    # report bad keys before they start streaming output.
+    if mode == "crack":
+        if not isinstance(source, str):
+            raise ValueError("Crack mode needs the whole text at once.")
+        return iter([crack_cipher(cipher_type, source)["plaintext"]])
+
     if cipher_type == "caesar":
         if key.strip() == "":
             raise ValueError("Caesar requires a numeric shift key.")
@@ -137,23 +526,30 @@ def cipher_transform(cipher_type: str, mode: str, text: str, key: str = "") -> s
             raise ValueError("Caesar key must be an integer.")
         if mode == "decode":
             shift = -shift
-        return caesar_cipher(text, shift)
+        table = CAESAR_TABLES[shift % 26]
+        return (chunk.translate(table) for chunk in iter_text_chunks(source))
 
     if cipher_type == "morse":
-        return morse_decode(text) if mode == "decode" else morse_encode(text)
+        return morse_decode_stream(source) if mode == "decode" else morse_encode_stream(source)
 
     if cipher_type == "atbash":
-        return atbash_cipher(text)
+        return (chunk.translate(ATBASH_TABLE) for chunk in iter_text_chunks(source))
 
     if cipher_type == "rot13":
-        return caesar_cipher(text, 13)
+        return (chunk.translate(CAESAR_TABLES[13]) for chunk in iter_text_chunks(source))
 
     if cipher_type == "vigenere":
-        return vigenere_cipher(text, key, decode=(mode == "decode"))
+        return vigenere_stream(source, key, decode=(mode == "decode"))
 
     raise ValueError("Unsupported cipher type.")
 
 
+@timed
+def cipher_transform(cipher_type: str, mode: str, text: str, key: str = "") -> str:
+    return "".join(cipher_stream(cipher_type, mode, text, key))
+
+
+@timed
 def tip_split(amount: float, percent: float, people: int) -> tuple[float, float]:
     if amount < 0:
         raise ValueError("Amount cannot be negative.")
@@ -167,41 +563,16 @@ def tip_split(amount: float, percent: float, people: int) -> tuple[float, float]
     return round(total, 2), round(per_person, 2)
 
 
+@timed
 def fetch_yahoo_fx_rate(from_currency: str, to_currency: str) -> float:
     from_code = from_currency.upper().strip()
     to_code = to_currency.upper().strip()
     if len(from_code) != 3 or len(to_code) != 3:
         raise ValueError("Currency codes must be 3 letters (example: USD, EUR).")
-
-    symbol = f"{from_code}{to_code}=X"
-    url = f"https://query1.finance.yahoo.com/v8/finance/chart/{quote(symbol)}"
-    try:
-        request = Request(
-            url,
-            headers={
-                "User-Agent": "Mozilla/5.0",
-                "Accept": "application/json",
-            },
-        )
-        with urlopen(request, timeout=8) as response:
-            payload = json.loads(response.read().decode("utf-8"))
-    except URLError as exc:
-        raise ValueError(f"Could not reach Yahoo Finance: {exc.reason}")
-    except Exception:
-        raise ValueError("Could not read Yahoo Finance response.")
-
-    try:
-        result = payload["chart"]["result"][0]
-        meta = result["meta"]
-        price = meta.get("regularMarketPrice") or meta.get("previousClose")
-    except (KeyError, IndexError, TypeError):
-        raise ValueError("Unexpected Yahoo Finance data format.")
-
-    if not isinstance(price, (int, float)) or price <= 0:
-        raise ValueError("Yahoo Finance returned an invalid exchange rate.")
-    return float(price)
+    return yahoo_provider().fetch(from_code, to_code)
 
 
+@timed
 def convert_currency(amount: float, rate: float) -> float:
     if amount < 0:
         raise ValueError("Amount cannot be negative.")
@@ -210,8 +581,69 @@ def convert_currency(amount: float, rate: float) -> float:
     return round(amount * rate, 4)
 
 
-FX_CACHE: dict[str, tuple[float, float]] = {}
 FX_CACHE_TTL_SECONDS = 600
+FX_CACHE_MAX_ENTRIES = 256
+FX_CACHE_STALE_SECONDS = 3600
+# fx pulls in http.client, ssl and the rate store, which only the currency tool
+# needs, so FX_CACHE and YAHOO_PROVIDER are created on first use. Module
+# attribute access (toolkit.FX_CACHE) goes through __getattr__ below.
+FX_CACHE: "FXCache"
+YAHOO_PROVIDER: "YahooFXProvider"
+_FX_LOCK = threading.Lock()
+
+
+def _load_fx() -> None:
+    with _FX_LOCK:
+        if "FX_CACHE" in globals():
+            return
+        from fx import YAHOO_PROVIDER, FXCache, rate_store_from_env
+
+        cache = FXCache(FX_CACHE_MAX_ENTRIES, FX_CACHE_TTL_SECONDS, FX_CACHE_STALE_SECONDS, rate_store_from_env())
+        globals().update(YAHOO_PROVIDER=YAHOO_PROVIDER, FX_CACHE=cache)
+
+
+def __getattr__(name: str):
+    if name in ("FX_CACHE", "YAHOO_PROVIDER"):
+        _load_fx()
+        return globals()[name]
+    if name == "np":
+        _load_numpy()
+        return np
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def fx_cache() -> "FXCache":
+    try:
+        return FX_CACHE
+    except NameError:
+        _load_fx()
+        return FX_CACHE
+
+
+def yahoo_provider() -> "YahooFXProvider":
+    try:
+        return YAHOO_PROVIDER
+    except NameError:
+        _load_fx()
+        return YAHOO_PROVIDER
+
+
+def _fx_cache_metrics():
+    if "FX_CACHE" not in globals():
+        return
+    stats = FX_CACHE.stats()
+    events = ("hits", "shared_hits", "misses", "stale_serves", "evictions", "refreshes", "refresh_errors", "fetches")
+    yield "fx_cache_events_total", "counter", "FX cache lookups by outcome.", [
+        (("event",), (event,), stats[event]) for event in events
+    ]
+    yield "fx_cache_entries", "gauge", "USD legs currently cached.", [((), (), stats["size"])]
+    yield "fx_fetch_seconds_total", "counter", "Time spent waiting on Yahoo Finance.", [
+        ((), (), stats["fetch_seconds_total"])
+    ]
+
+
+register_collector(_fx_cache_metrics)
+
 SNAPSHOT_DATE = "2026-02-16"
 SNAPSHOT_USD_BASED = {
     "USD": 1.0,
@@ -238,123 +670,420 @@ def _snapshot_fx_rate(from_currency: str, to_currency: str) -> float:
     return usd_to_to / usd_to_from
 
 
+def _archived_fx_rate(from_code: str, to_code: str, on: date) -> tuple[float, str]:
+    # The imported snapshot archive when there is one, else the built-in snapshot.
+    archive = FX_ARCHIVE.get()
+    if archive is not None:
+        rate, snapshot_date = archive.cross_rate(from_code, to_code, on)
+        return rate, snapshot_date.isoformat()
+    if on.isoformat() < SNAPSHOT_DATE:
+        raise ValueError(f"No FX snapshot on or before {on.isoformat()}.")
+    return _snapshot_fx_rate(from_code, to_code), SNAPSHOT_DATE
+
+
+@timed
+def get_historical_fx_rate(from_currency: str, to_currency: str, on: str) -> tuple[float, str]:
+    # Returns the rate and the date of the snapshot it came from.
+    try:
+        day = _parse_iso_date(on.strip())
+    except ValueError:
+        raise ValueError("Use YYYY-MM-DD for the date.")
+    return _archived_fx_rate(from_currency.upper().strip(), to_currency.upper().strip(), day)
+
+
+def _usd_leg(currency_code: str, now: float) -> tuple[float, float, bool]:
+    if currency_code == "USD":
+        return 1.0, now, False
+    return fx_cache().get_or_load(currency_code, lambda: fetch_yahoo_fx_rate("USD", currency_code))
+
+
+@timed
 def get_fx_rate_with_fallback(from_currency: str, to_currency: str) -> tuple[float, str, str]:
-    key = f"{from_currency.upper()}:{to_currency.upper()}"
+    # FX_CACHE holds USD-based legs, so any pair is a local cross like _snapshot_fx_rate.
+    from_code = from_currency.upper().strip()
+    to_code = to_currency.upper().strip()
     now = time()
-    cached = FX_CACHE.get(key)
-    if cached and (now - cached[1]) < FX_CACHE_TTL_SECONDS:
-        return cached[0], "Yahoo Finance (cached)", datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
     try:
-        rate = fetch_yahoo_fx_rate(from_currency, to_currency)
-        FX_CACHE[key] = (rate, now)
-        return rate, "Yahoo Finance (live)", datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        usd_to_from, from_updated, from_live = _usd_leg(from_code, now)
+        usd_to_to, to_updated, to_live = _usd_leg(to_code, now)
     except ValueError as exc:
         message = str(exc)
         if "Too Many Requests" in message or "429" in message or "Could not reach Yahoo Finance" in message:
-            rate = _snapshot_fx_rate(from_currency, to_currency)
-            return rate, "Snapshot fallback", SNAPSHOT_DATE
+            rate, snapshot_date = _archived_fx_rate(from_code, to_code, date.today())
+            FX_FALLBACKS.inc()
+            return rate, "Snapshot fallback", snapshot_date
         raise
 
+    source = "Yahoo Finance (live)" if from_live or to_live else "Yahoo Finance (cached)"
+    last_updated = datetime.fromtimestamp(min(from_updated, to_updated)).strftime("%Y-%m-%d %H:%M:%S")
+    return usd_to_to / usd_to_from, source, last_updated
 
+
+async def get_fx_rate_with_fallback_async(from_currency: str, to_currency: str) -> tuple[float, str, str]:
+    # The blocking lookup runs on the default executor; concurrent misses for the
+    # same pair still share one upstream request through the provider.
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, get_fx_rate_with_fallback, from_currency, to_currency)
+
+
+FUEL_UNITS = frozenset({"mpg_us", "km_per_l", "l_per_100km"})
+KM_PER_L_PER_MPG_US = 0.425143707
+NumberSequence = Iterable[float]
+
+
+@timed
 def convert_fuel_consumption(value: float, from_unit: str, to_unit: str) -> float:
     if value <= 0:
         raise ValueError("Fuel value must be greater than 0.")
 
-    factors = {"mpg_us", "km_per_l", "l_per_100km"}
-    if from_unit not in factors or to_unit not in factors:
+    if from_unit not in FUEL_UNITS or to_unit not in FUEL_UNITS:
         raise ValueError("Invalid fuel unit selection.")
 
     if from_unit == "mpg_us":
-        km_per_l = value * 0.425143707
+        km_per_l = value * KM_PER_L_PER_MPG_US
     elif from_unit == "km_per_l":
         km_per_l = value
     else:
         km_per_l = 100 / value
+    if km_per_l == 0:
+        raise ValueError("Fuel value is too small to convert.")
 
     if to_unit == "km_per_l":
         return round(km_per_l, 6)
     if to_unit == "mpg_us":
-        return round(km_per_l / 0.425143707, 6)
+        return round(km_per_l / KM_PER_L_PER_MPG_US, 6)
     return round(100 / km_per_l, 6)
 
 
+def _round_half_even_array(values, ndigits: int):
+    # np.round scales by 10**ndigits, which can land on the wrong side of a tie
+    # that Python's correctly rounded round() gets right. Those few elements, and
+    # values too large for the scaled integer to be exact, go through round().
+    scale = 10.0**ndigits
+    # Huge values overflow to inf once scaled; they are flagged and redone below.
+    with np.errstate(over="ignore", invalid="ignore"):
+        scaled = values * scale
+        rounded = np.rint(scaled) / scale
+        distance_to_tie = np.abs(scaled - np.floor(scaled) - 0.5)
+    magnitude = np.abs(scaled)
+    suspect = (distance_to_tie <= magnitude * 4e-16) | (magnitude >= 2.0**52)
+    for index in np.flatnonzero(suspect):
+        rounded[index] = round(float(values[index]), ndigits)
+    return rounded
+
+
+@timed
+def convert_fuel_consumption_bulk(values: NumberSequence, from_unit: str, to_unit: str):
+    if from_unit not in FUEL_UNITS or to_unit not in FUEL_UNITS:
+        raise ValueError("Invalid fuel unit selection.")
+    if numpy_module() is None:
+        return array("d", (convert_fuel_consumption(value, from_unit, to_unit) for value in values))
+
+    values = np.asarray(values, dtype=np.float64)
+    if np.any(values <= 0):
+        raise ValueError("Fuel value must be greater than 0.")
+
+    # Extreme inputs overflow to inf (or underflow to 0) exactly as the scalar
+    # path does, just without Python's float arithmetic warning about it.
+    with np.errstate(over="ignore", divide="ignore"):
+        if from_unit == "mpg_us":
+            km_per_l = values * KM_PER_L_PER_MPG_US
+        elif from_unit == "km_per_l":
+            km_per_l = values
+        else:
+            km_per_l = 100 / values
+        if np.any(km_per_l == 0):
+            raise ValueError("Fuel value is too small to convert.")
+
+        if to_unit == "km_per_l":
+            converted = km_per_l
+        elif to_unit == "mpg_us":
+            converted = km_per_l / KM_PER_L_PER_MPG_US
+        else:
+            converted = 100 / km_per_l
+    return _round_half_even_array(converted, 6)
+
+
 def _add_months_safe(start: date, months: int) -> date:
     year = start.year + (start.month - 1 + months) // 12
     month = (start.month - 1 + months) % 12 + 1
-    day = start.day
-    while True:
-        try:
-            return date(year, month, day)
-        except ValueError:
-            day -= 1
+    return date(year, month, min(start.day, monthrange(year, month)[1]))
 
 
-def count_date_distance(reference_date: str, target_date: str) -> dict:
-    try:
-        ref = datetime.strptime(reference_date, "%Y-%m-%d").date()
-        target = datetime.strptime(target_date, "%Y-%m-%d").date()
-    except ValueError:
-        raise ValueError("Use YYYY-MM-DD for both dates.")
+def _parse_iso_date(value: str) -> date:
+    # date.fromisoformat is much faster than strptime and agrees with it on
+    # plain YYYY-MM-DD strings; anything else keeps strptime's rules.
+    if (
+        len(value) == 10
+        and value.isascii()
+        and value[4] == "-"
+        and value[7] == "-"
+        and value[:4].isdigit()
+        and value[5:7].isdigit()
+        and value[8:].isdigit()
+    ):
+        return date.fromisoformat(value)
+    return datetime.strptime(value, "%Y-%m-%d").date()
 
-    delta_days = (target - ref).days
-    direction = "future" if delta_days > 0 else "past" if delta_days < 0 else "today"
 
+def _date_span(ref: date, target: date) -> tuple[int, int, int]:
     start, end = (ref, target) if ref <= target else (target, ref)
     months = (end.year - start.year) * 12 + (end.month - start.month)
     if end.day < start.day:
         months -= 1
     month_anchor = _add_months_safe(start, months)
-    leftover_days = (end - month_anchor).days
-    weeks = round(abs(delta_days) / 7, 2)
+    return months // 12, months % 12, (end - month_anchor).days
+
+
+def _direction(delta_days: int) -> str:
+    return "future" if delta_days > 0 else "past" if delta_days < 0 else "today"
+
 
-    years = months // 12
-    rem_months = months % 12
+def _human_span(direction: str, years: int, rem_months: int, leftover_days: int) -> str:
     year_label = "year" if years == 1 else "years"
     month_label = "month" if rem_months == 1 else "months"
     day_label = "day" if leftover_days == 1 else "days"
     parts = [f"{years} {year_label}", f"{rem_months} {month_label}", f"{leftover_days} {day_label}"]
     span = ", ".join(parts)
     if direction == "future":
-        human_span = f"in {span}"
-    elif direction == "past":
-        human_span = f"{span} ago"
-    else:
-        human_span = "today"
+        return f"in {span}"
+    if direction == "past":
+        return f"{span} ago"
+    return "today"
+
+
+@timed
+def count_date_distance(reference_date: str, target_date: str) -> dict:
+    try:
+        ref = _parse_iso_date(reference_date)
+        target = _parse_iso_date(target_date)
+    except ValueError:
+        raise ValueError("Use YYYY-MM-DD for both dates.")
+
+    delta_days = (target - ref).days
+    direction = _direction(delta_days)
+    years, rem_months, leftover_days = _date_span(ref, target)
 
     return {
         "target_weekday": target.strftime("%A"),
         "delta_days": delta_days,
         "direction": direction,
-        "weeks": weeks,
+        "weeks": round(abs(delta_days) / 7, 2),
         "years": years,
         "months": rem_months,
         "remaining_days": leftover_days,
-        "human_span": human_span,
+        "human_span": _human_span(direction, years, rem_months, leftover_days),
     }
 
 
+class DateDistanceBatch:
+    # Column-wise results of count_date_distance_bulk. Numeric columns are
+    # computed up front; weekday names and human-readable spans only on request.
+    def __init__(self, target_ordinals, delta_days, weeks, years, months, remaining_days, errors) -> None:
+        self.target_ordinals = target_ordinals
+        self.delta_days = delta_days
+        self.weeks = weeks
+        self.years = years
+        self.months = months
+        self.remaining_days = remaining_days
+        self.errors = errors
+
+    def __len__(self) -> int:
+        return len(self.delta_days)
+
+    def direction(self, index: int) -> str:
+        return _direction(int(self.delta_days[index]))
+
+    def target_weekday(self, index: int) -> str:
+        return date.fromordinal(int(self.target_ordinals[index])).strftime("%A")
+
+    def human_span(self, index: int) -> str:
+        years, months = int(self.years[index]), int(self.months[index])
+        return _human_span(self.direction(index), years, months, int(self.remaining_days[index]))
+
+    def row(self, index: int) -> dict:
+        if index in self.errors:
+            raise ValueError(self.errors[index])
+        return {
+            "target_weekday": self.target_weekday(index),
+            "delta_days": int(self.delta_days[index]),
+            "direction": self.direction(index),
+            "weeks": float(self.weeks[index]),
+            "years": int(self.years[index]),
+            "months": int(self.months[index]),
+            "remaining_days": int(self.remaining_days[index]),
+            "human_span": self.human_span(index),
+        }
+
+    def rows(self) -> Iterator[dict]:
+        for index in range(len(self)):
+            if index not in self.errors:
+                yield self.row(index)
+
+
+ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}", re.ASCII)
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _date_ordinals(values: list, errors: dict) -> list[int]:
+    ordinals = []
+    for index, value in enumerate(values):
+        try:
+            ordinals.append(_parse_iso_date(value).toordinal())
+        except (TypeError, ValueError):
+            errors[index] = "Use YYYY-MM-DD for both dates."
+            ordinals.append(1)
+    return ordinals
+
+
+def _date_column(values: list, errors: dict):
+    # Whole-column fast path: NumPy parses strict YYYY-MM-DD strings in C. Any
+    # column with other spellings or invalid dates is parsed row by row instead.
+    try:
+        if all(map(ISO_DATE.fullmatch, values)):
+            column = np.array(values, dtype="datetime64[D]")
+            if len(column) == 0 or column.min() >= np.datetime64("0001-01-01"):
+                return column
+    except (TypeError, ValueError):
+        pass
+    ordinals = np.array(_date_ordinals(values, errors), dtype=np.int64)
+    return (ordinals - EPOCH_ORDINAL).astype("datetime64[D]")
+
+
+@timed
+def count_date_distance_bulk(reference_dates: Iterable[str], target_dates: Iterable[str]) -> DateDistanceBatch:
+    reference_dates, target_dates = list(reference_dates), list(target_dates)
+    if len(reference_dates) != len(target_dates):
+        raise ValueError("Reference and target columns must have the same length.")
+    errors: dict[int, str] = {}
+
+    if numpy_module() is None:
+        ref_ordinals = _date_ordinals(reference_dates, errors)
+        target_ordinals = _date_ordinals(target_dates, errors)
+        delta_days, years, months, remaining_days = [], [], [], []
+        for ref_ordinal, target_ordinal in zip(ref_ordinals, target_ordinals):
+            span = _date_span(date.fromordinal(ref_ordinal), date.fromordinal(target_ordinal))
+            delta_days.append(target_ordinal - ref_ordinal)
+            years.append(span[0])
+            months.append(span[1])
+            remaining_days.append(span[2])
+        weeks = [round(abs(delta) / 7, 2) for delta in delta_days]
+        return DateDistanceBatch(target_ordinals, delta_days, weeks, years, months, remaining_days, errors)
+
+    ref = _date_column(reference_dates, errors)
+    target = _date_column(target_dates, errors)
+    delta_days = (target - ref).astype(np.int64)
+
+    start, end = np.minimum(ref, target), np.maximum(ref, target)
+    start_month, end_month = start.astype("datetime64[M]"), end.astype("datetime64[M]")
+    start_day = (start - start_month).astype(np.int64) + 1
+    end_day = (end - end_month).astype(np.int64) + 1
+    months = (end_month - start_month).astype(np.int64) - (end_day < start_day)
+
+    # _add_months_safe: same day of month, clamped to the anchor month's length.
+    anchor_month = start_month + months
+    anchor_first = anchor_month.astype("datetime64[D]")
+    month_length = ((anchor_month + 1).astype("datetime64[D]") - anchor_first).astype(np.int64)
+    anchor = anchor_first + (np.minimum(start_day, month_length) - 1)
+    remaining_days = (end - anchor).astype(np.int64)
+
+    weeks = _round_half_even_array(np.abs(delta_days) / 7, 2)
+    target_ordinals = target.astype(np.int64) + EPOCH_ORDINAL
+    return DateDistanceBatch(target_ordinals, delta_days, weeks, months // 12, months % 12, remaining_days, errors)
+
+
+SI_PREFIX_EXPONENTS = {
+    "pico": -12,
+    "nano": -9,
+    "micro": -6,
+    "milli": -3,
+    "base": 0,
+    "kilo": 3,
+    "mega": 6,
+    "giga": 9,
+}
+SI_PREFIX_SCALES = {prefix: 10**exponent for prefix, exponent in SI_PREFIX_EXPONENTS.items()}
+# Same values as the scalar path's 10 ** exponent, indexed by exponent + POW10_OFFSET.
+POW10_OFFSET = 330
+POW10_EXPONENTS = range(-POW10_OFFSET, 309)
+
+
+@lru_cache(maxsize=1)
+def _pow10_table():
+    return np.array([float(10**e) for e in POW10_EXPONENTS])
+
+
+def _scientific_parts(base_value: float) -> tuple[float, int]:
+    if base_value == 0:
+        return 0.0, 0
+    sci_exp = int(f"{base_value:e}".split("e")[1])
+    if sci_exp < -300:
+        # 10**sci_exp underflows to zero for the smallest subnormals; scale first.
+        return base_value * 1e300 / (10 ** (sci_exp + 300)), sci_exp
+    return base_value / (10**sci_exp), sci_exp
+
+
+@timed
 def convert_scientific_prefix(value: float, from_prefix: str, to_prefix: str) -> tuple[float, str]:
-    exponents = {
-        "pico": -12,
-        "nano": -9,
-        "micro": -6,
-        "milli": -3,
-        "base": 0,
-        "kilo": 3,
-        "mega": 6,
-        "giga": 9,
-    }
-    if from_prefix not in exponents or to_prefix not in exponents:
+    if from_prefix not in SI_PREFIX_EXPONENTS or to_prefix not in SI_PREFIX_EXPONENTS:
         raise ValueError("Invalid prefix selection.")
 
-    base_value = value * (10 ** exponents[from_prefix])
-    converted = base_value / (10 ** exponents[to_prefix])
+    base_value = value * SI_PREFIX_SCALES[from_prefix]
+    if not math.isfinite(base_value):
+        raise ValueError("Values must be finite numbers.")
+    converted = base_value / SI_PREFIX_SCALES[to_prefix]
 
     if base_value == 0:
         sci = "0 x 10^0"
     else:
-        sci_exp = int(f"{base_value:e}".split("e")[1])
-        sci_coeff = base_value / (10 ** sci_exp)
+        sci_coeff, sci_exp = _scientific_parts(base_value)
         sci = f"{sci_coeff:.6g} x 10^{sci_exp}"
     return converted, sci
+
+
+@timed
+def convert_scientific_prefix_bulk(values: NumberSequence, from_prefix: str, to_prefix: str) -> tuple:
+    # Returns (converted, coefficients, exponents); coefficient * 10**exponent is
+    # the base-unit value, exactly as convert_scientific_prefix formats it.
+    if from_prefix not in SI_PREFIX_EXPONENTS or to_prefix not in SI_PREFIX_EXPONENTS:
+        raise ValueError("Invalid prefix selection.")
+
+    if numpy_module() is None:
+        base_values = [value * SI_PREFIX_SCALES[from_prefix] for value in values]
+        if not all(map(math.isfinite, base_values)):
+            raise ValueError("Values must be finite numbers.")
+        parts = [_scientific_parts(base_value) for base_value in base_values]
+        return (
+            array("d", (base_value / SI_PREFIX_SCALES[to_prefix] for base_value in base_values)),
+            array("d", (coeff for coeff, _ in parts)),
+            array("i", (exponent for _, exponent in parts)),
+        )
+
+    # Overflow gives inf, as in the scalar path; only the base values must be finite.
+    with np.errstate(over="ignore", invalid="ignore"):
+        base_values = np.asarray(values, dtype=np.float64) * SI_PREFIX_SCALES[from_prefix]
+        converted = base_values / SI_PREFIX_SCALES[to_prefix]
+    if not np.all(np.isfinite(base_values)):
+        raise ValueError("Values must be finite numbers.")
+
+    pow10 = _pow10_table()
+    magnitude = np.abs(base_values)
+    nonzero = magnitude != 0
+    exponents = np.zeros(len(base_values), dtype=np.int64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        exponents[nonzero] = np.floor(np.log10(magnitude[nonzero]))
+        mantissa = magnitude / pow10[exponents + POW10_OFFSET]
+        exponents -= (mantissa < 1) & nonzero
+        exponents += mantissa >= 10
+        mantissa = magnitude / pow10[exponents + POW10_OFFSET]
+        # "%e" keeps 7 significant digits, so mantissas that round up to 10 carry.
+        exponents += mantissa >= 9.9999995
+        coefficients = np.where(nonzero, base_values / pow10[exponents + POW10_OFFSET], 0.0)
+
+    # Near the rounding threshold, and for subnormal powers of ten, defer to the scalar path.
+    suspect = (np.abs(mantissa - 9.9999995) < 1e-9) | (nonzero & (magnitude < 1e-290))
+    for index in np.flatnonzero(suspect):
+        coefficients[index], exponents[index] = _scientific_parts(float(base_values[index]))
+    return converted, coefficients, exponents